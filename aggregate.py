@@ -1,7 +1,28 @@
 from typing import Optional
+import hashlib
+import os
+import numpy as np
 import pandas as pd
 from dateutil.parser import parse
 from datetime import datetime
+from functools import cached_property
+
+INDICATORS = ['protest', 'suppression', 'anticipated']
+ALERT_COLUMNS = ['OSAC_ID', 'country', 'date', *INDICATORS]
+# Number of alerts flagging each indicator, next to its 0/1 maximum
+COUNT_COLUMNS = [f'{indicator}_count' for indicator in INDICATORS]
+COUNT_DTYPE = np.uint16
+# Indicators are 0/1 flags, their maxima fit in a byte
+FLAG_DTYPE = np.uint8
+DAILY_START = "2004-01-01"
+# Sparse event store: one row per (country, day) with any nonzero indicator,
+# as typed columns in a compressed .npz file, with every country's latest alert
+EVENTS_FORMAT_VERSION = 3
+# Calendar rollups (maxima over their days) and trailing windows (days with
+# each indicator), all taken from the daily array and saved to one .npz file
+ROLLUP_PERIODS = ['week', 'month', 'quarter', 'year']
+ROLLING_WINDOWS = [30, 90]
+ROLLUPS_FORMAT_VERSION = 1
 
 class OSACAggregateProcessor:
     def __init__(self, parsed_file_name: str, iso_country_file: str):
@@ -23,74 +44,323 @@ class OSACAggregateProcessor:
                 return parse(date_str,fuzzy=True)  # Fallback to flexible parsing
             except Exception:
                 return pd.NaT
-    def get_all_country_dates(self, start_date, end_date):
-        # Create a full date range using ALL ISO countries
-        full_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        # Cartesian product between all countries and full date range
-        full_index = pd.MultiIndex.from_product(
-            [self.all_countries, full_dates],
-            names=['country', 'date']
-        )
-        return pd.DataFrame(index=full_index).reset_index()
-
-    @property
-    def extract_daily_data(self) -> pd.DataFrame:
-        # Step 1: Load and clean alert data
-        df = self.df[['country', 'date', 'protest', 'suppression', 'anticipated']].copy()
+    def clean_alerts(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Alerts with a country, a parsed date and integer indicators"""
+        df = df[['country', 'date', *INDICATORS]].copy()
         df.replace('', pd.NA, inplace=True)
         df.dropna(subset=['country', 'date'], how='any', inplace=True)
-        
-        # Convert dates and ensure consistent format
-        #df['date'] = pd.to_datetime(df['date'].apply(self.safe_parse)).dt.normalize()
-        df['date'] = pd.to_datetime(df['date'].apply(self.safe_parse), format="%d/%m/%Y", errors='coerce').dt.normalize()
-
 
+        # Each distinct date string is parsed once, alerts share a few thousand days
+        parsed = {d: self.safe_parse(d) for d in df['date'].unique()}
+        df['date'] = pd.to_datetime(df['date'].map(parsed), format="%d/%m/%Y", errors='coerce').dt.normalize()
         df = df.dropna(subset=['date'])
-        
+
         # Convert indicators to integers
-        indicators = ['protest', 'suppression', 'anticipated']
-        df[indicators] = df[indicators].fillna(0).astype(int)
+        df[INDICATORS] = df[INDICATORS].fillna(0).astype(int)
+        return df
+
+    def parsed_digest(self) -> str:
+        """sha1 of the parsed file as it is on disk now"""
+        with open(self.parsed_file_name, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
 
-        # Step 2: Create complete date range
-        #start_date = df['date'].min()
-        start_date = pd.to_datetime("2004-01-01")
-        #end_date = df['date'].max()
+    @cached_property
+    def countries(self) -> pd.Index:
+        """Distinct ISO countries, the rows of the daily array"""
+        return pd.Index(list(dict.fromkeys(self.all_countries)))
+
+    @staticmethod
+    def end_of_month() -> pd.Timestamp:
         today = datetime.now().date()
-        end_of_month = pd.to_datetime(datetime(today.year, today.month, 1) + pd.offsets.MonthEnd(1))
-        end_date = min(df['date'].max(), end_of_month)
-        full_dates_df = self.get_all_country_dates(start_date, end_date)
-        full_dates_df['date'] = pd.to_datetime(full_dates_df['date']).dt.normalize()
-
-        # Step 3: Standardize country names before merge
-        # Create a mapping from alert country names to ISO codes if needed
-        # (This assumes you have a way to map them - may need additional logic)
-        country_map = {c: c for c in df['country'].unique()}  # Default 1:1 mapping
-        
-        grouped = (
-            df.assign(country_iso=df['country'].map(country_map))
-            .groupby(['country_iso', 'date'])[indicators]
-            .max()
-            .reset_index()
-        )
-
-        # Step 4: Perform merge with proper columns
-        full_daily = (
-            full_dates_df
-            .merge(grouped, 
-                  left_on=['country', 'date'],
-                  right_on=['country_iso', 'date'],
-                  how='left')
-            .drop(columns=['country_iso'])
-        )
-        
-        # Fill missing values
-        full_daily[indicators] = full_daily[indicators].fillna(0).astype(int)
-        
+        return pd.to_datetime(datetime(today.year, today.month, 1) + pd.offsets.MonthEnd(1))
+
+    def set_daily_array(self, dates: pd.DatetimeIndex, array: np.ndarray, counts: np.ndarray) -> None:
+        # Stored where cached_property keeps its value; rollups are derived from it
+        self.__dict__['daily_array'] = (dates, array, counts)
+        self.__dict__.pop('rollups', None)
+
+    def scatter(self, array: np.ndarray, counts: np.ndarray, dates: pd.DatetimeIndex, alerts: pd.DataFrame) -> None:
+        """Max every alert's indicators into its (country, day) cell of array, and count them in counts"""
+        rows = self.countries.get_indexer(alerts['country'])
+        days = ((alerts['date'] - dates[0]).dt.days).to_numpy()
+        # Alerts outside the ISO list or the date range have no cell
+        keep = (rows >= 0) & (days >= 0) & (days < len(dates))
+        cells = (rows[keep], days[keep])
+        values = alerts[INDICATORS].to_numpy()[keep].astype(array.dtype)
+        np.maximum.at(array, cells, values)
+        np.add.at(counts, cells, (values > 0).astype(counts.dtype))
+
+    @cached_property
+    def daily_array(self) -> tuple:
+        """(dates, [country, day, indicator] maxima, same-shaped alert counts), computed once
+
+        Every alert's indicators are scattered straight into preallocated
+        country x day arrays, instead of merging the grouped alerts into a
+        frame of every country x every day.
+        """
+        df = self.clean_alerts(self.df)
+        # Kept for apply_delta, which only cleans the alerts of some countries
+        self.latest_dates = df.groupby('country')['date'].max()
+        end_date = min(self.latest_dates.max(), self.end_of_month())
+        dates = pd.date_range(start=DAILY_START, end=end_date, freq='D')
+        array = np.zeros((len(self.countries), len(dates), len(INDICATORS)), dtype=FLAG_DTYPE)
+        counts = np.zeros(array.shape, dtype=COUNT_DTYPE)
+        self.scatter(array, counts, dates, df)
+        return dates, array, counts
+
+    def save_events(self, path: str) -> None:
+        """Write the daily array as a sparse event store, replacing any old one atomically
+
+        The digest of the parsed file is stored with it, so that a later
+        load_events only trusts the store if that file has not changed since.
+        """
+        dates, array, counts = self.daily_array
+        rows, days = np.nonzero(array.any(axis=2))
+        columns = {
+            'country': rows.astype(np.min_scalar_type(max(len(self.countries) - 1, 0))),
+            'day': days.astype(np.min_scalar_type(max(len(dates) - 1, 0))),
+        }
+        for i, indicator in enumerate(INDICATORS):
+            values = array[rows, days, i]
+            columns[indicator] = values.astype(np.min_scalar_type(values.max() if len(values) else 0))
+            columns[COUNT_COLUMNS[i]] = counts[rows, days, i]
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(EVENTS_FORMAT_VERSION),
+                parsed_digest=np.array(self.parsed_digest()),
+                countries=np.array(list(self.countries), dtype=str),
+                start=np.array(DAILY_START, dtype='datetime64[D]'),
+                days=np.array(len(dates)),
+                latest_countries=np.array(list(self.latest_dates.index), dtype=str),
+                latest_dates=self.latest_dates.to_numpy(dtype='datetime64[D]'),
+                **columns,
+            )
+        os.replace(path + ".tmp", path)
+
+    def load_events(self, path: str) -> None:
+        """Take the daily array from a previous save_events store instead of recomputing it"""
+        with np.load(path) as events:
+            if int(events['format_version']) != EVENTS_FORMAT_VERSION:
+                raise ValueError(f"Unsupported event store format {int(events['format_version'])}: {path}")
+            if 'parsed_digest' not in events.files or str(events['parsed_digest']) != self.parsed_digest():
+                raise ValueError(f"Event store was not built from {self.parsed_file_name}: {path}")
+            dates = pd.date_range(start=DAILY_START, periods=int(events['days']), freq='D')
+            # The ISO list may have changed since the store was written
+            rows = self.countries.get_indexer(events['countries'])[events['country']]
+            days = events['day'].astype(np.int64)
+            values = np.stack([events[indicator] for indicator in INDICATORS], axis=1)
+            alert_counts = np.stack([events[column] for column in COUNT_COLUMNS], axis=1)
+            latest_dates = pd.Series(pd.to_datetime(events['latest_dates']), index=events['latest_countries'])
+        keep = rows >= 0
+        array = np.zeros((len(self.countries), len(dates), len(INDICATORS)), dtype=FLAG_DTYPE)
+        array[rows[keep], days[keep]] = values[keep]
+        counts = np.zeros(array.shape, dtype=COUNT_DTYPE)
+        counts[rows[keep], days[keep]] = alert_counts[keep]
+        self.set_daily_array(dates, array, counts)
+        self.latest_dates = latest_dates
+
+    @staticmethod
+    def alert_ids(df: pd.DataFrame) -> pd.Series:
+        """OSAC_IDs as strings, '' for alerts without one (protected links)"""
+        ids = df['OSAC_ID']
+        if pd.api.types.is_float_dtype(ids):
+            # IDs are read back as floats when some of them are blank
+            ids = ids.astype('Int64')
+        return ids.astype('string').str.strip().fillna('')
+
+    @staticmethod
+    def row_hashes(df: pd.DataFrame, ids: pd.Series) -> np.ndarray:
+        """One hash per alert over its ID, country, date and indicators"""
+        rows = pd.DataFrame({
+            'OSAC_ID': ids.to_numpy(),
+            'country': df['country'].astype('string').to_numpy(),
+            'date': df['date'].astype('string').to_numpy(),
+        })
+        for indicator in INDICATORS:
+            rows[indicator] = pd.to_numeric(df[indicator], errors='coerce').fillna(0).to_numpy(dtype=float)
+        return pd.util.hash_pandas_object(rows, index=False).to_numpy()
+
+    def changed_rows(self, parsed_df: pd.DataFrame) -> tuple:
+        """(rows of parsed_df that are new or changed, OSAC_IDs it no longer has) against self.df
+
+        Rows are matched by OSAC_ID, so a ValueError is raised when an ID
+        appears twice on either side. Rows without an ID (protected links)
+        are matched as one group under the ID '': if any of them changed,
+        all of parsed_df's are returned, and '' is removed if it has none.
+        """
+        old_ids, new_ids = self.alert_ids(self.df), self.alert_ids(parsed_df)
+        for ids in (old_ids, new_ids):
+            if ids[ids != ''].duplicated().any():
+                raise ValueError("OSAC_IDs are not unique, rows cannot be matched")
+        old_hashes = self.row_hashes(self.df, old_ids)
+        new_hashes = self.row_hashes(parsed_df, new_ids)
+
+        old_blank, new_blank = (old_ids == '').to_numpy(), (new_ids == '').to_numpy()
+        positions = pd.Index(old_ids[~old_blank]).get_indexer(new_ids)
+        known = positions >= 0
+        changed = ~known
+        changed[known] = old_hashes[~old_blank][positions[known]] != new_hashes[known]
+        if np.array_equal(np.sort(old_hashes[old_blank]), np.sort(new_hashes[new_blank])):
+            changed &= ~new_blank
+        else:
+            changed |= new_blank
+        removed = set(old_ids) - set(new_ids)
+        return parsed_df[changed], removed
+
+    def apply_delta(self, delta: pd.DataFrame, removed_ids=()) -> list:
+        """Fold new or changed parsed rows into self.df and the daily array
+
+        Rows replace the ones with the same OSAC_ID. Only countries that had a
+        row added, changed or removed are cleaned and recomputed, from their
+        own alerts, along with those whose alerts the range grows to cover.
+        Returns the recomputed countries.
+        """
+        ids = set(self.alert_ids(delta)) | {str(i) for i in removed_ids}
+        replaced = self.alert_ids(self.df).isin(ids).to_numpy()
+        touched = set(self.df.loc[replaced, 'country'].dropna()) | set(delta['country'].dropna())
+        self.df = pd.concat([self.df[~replaced], delta], ignore_index=True)
+
+        dates, array, counts = self.daily_array
+        alerts = self.clean_alerts(self.df[self.df['country'].isin(touched)])
+        latest = alerts.groupby('country')['date'].max()
+        self.latest_dates = pd.concat([self.latest_dates.drop(touched, errors='ignore'), latest])
+        end_date = min(self.latest_dates.max(), self.end_of_month())
+        if end_date > dates[-1]:
+            # New days start empty; untouched countries with alerts that now
+            # fall inside the range are recomputed as well
+            grown = pd.date_range(start=dates[0], end=end_date, freq='D')
+            padding = ((0, 0), (0, len(grown) - len(dates)), (0, 0))
+            array = np.pad(array, padding)
+            counts = np.pad(counts, padding)
+            covered = set(self.latest_dates.index[self.latest_dates > dates[-1]]) - touched
+            if covered:
+                alerts = pd.concat([alerts, self.clean_alerts(self.df[self.df['country'].isin(covered)])])
+                touched |= covered
+            dates = grown
+        elif end_date < dates[-1]:
+            # The latest alert was removed or moved back
+            dates = dates[dates <= end_date]
+            array = array[:, :len(dates)].copy()
+            counts = counts[:, :len(dates)].copy()
+
+        touched = sorted(c for c in touched if c in self.countries)
+        array[self.countries.get_indexer(touched)] = 0
+        counts[self.countries.get_indexer(touched)] = 0
+        self.scatter(array, counts, dates, alerts[alerts['country'].isin(touched)])
+        self.set_daily_array(dates, array, counts)
+        return touched
+
+    @property
+    def extract_daily_data(self) -> pd.DataFrame:
+        dates, array, counts = self.daily_array
+        # One block of days per line of the ISO file, in file order
+        rows = self.countries.get_indexer(self.all_countries)
+        full_daily = pd.DataFrame({
+            'country': np.repeat(np.array(self.all_countries, dtype=object), len(dates)),
+            'date': np.tile(dates.values, len(rows)),
+        })
+        for i, indicator in enumerate(INDICATORS):
+            full_daily[indicator] = array[rows, :, i].ravel().astype(np.int64)
+        for i, column in enumerate(COUNT_COLUMNS):
+            full_daily[column] = counts[rows, :, i].ravel()
         return full_daily
 
+    @staticmethod
+    def period_starts(dates: pd.DatetimeIndex, period: str) -> tuple:
+        """(offset of the first day, label) of every calendar period the days cover"""
+        if period == 'week':
+            first = dates.dayofweek == 0
+            labels = '%G-W%V'
+        elif period == 'month':
+            first = dates.day == 1
+            labels = '%Y-%m'
+        elif period == 'quarter':
+            first = (dates.day == 1) & (dates.month % 3 == 1)
+            labels = None
+        else:
+            first = dates.dayofyear == 1
+            labels = '%Y'
+        # Days are contiguous, so every period is one run; the first may be partial
+        starts = np.flatnonzero(first | (np.arange(len(dates)) == 0))
+        if labels is None:
+            return starts, [f"{d.year}-Q{d.quarter}" for d in dates[starts]]
+        return starts, list(dates[starts].strftime(labels))
+
+    @cached_property
+    def rollups(self) -> dict:
+        """{name: (labels, array [country, bucket, indicator])} for every rollup, computed once
+
+        Calendar periods hold the maxima of their days, like the monthly
+        output, and `<period>_count` the number of alerts in them, capped
+        at the uint16 maximum. `rolling_<n>` holds, for every day, how many
+        of the last n days up to it had each indicator.
+        """
+        dates, array, counts = self.daily_array
+        rollups = {}
+        if len(dates) == 0:
+            return rollups
+        for period in ROLLUP_PERIODS:
+            starts, labels = self.period_starts(dates, period)
+            rollups[period] = (labels, np.maximum.reduceat(array, starts, axis=1).astype(np.uint8))
+            totals = np.add.reduceat(counts, starts, axis=1, dtype=np.uint32)
+            rollups[f'{period}_count'] = (labels, np.minimum(totals, np.iinfo(COUNT_DTYPE).max).astype(COUNT_DTYPE))
+        # One running count of flagged days serves every window
+        dtype = np.min_scalar_type(max(ROLLING_WINDOWS))
+        sums = np.zeros((array.shape[0], len(dates) + 1, array.shape[2]), dtype=np.int32)
+        np.cumsum(array > 0, axis=1, out=sums[:, 1:])
+        ends = np.arange(1, len(dates) + 1)
+        labels = list(dates.strftime('%Y-%m-%d'))
+        for window in ROLLING_WINDOWS:
+            counts = sums[:, ends] - sums[:, np.maximum(ends - window, 0)]
+            rollups[f'rolling_{window}'] = (labels, counts.astype(dtype))
+        return rollups
+
+    def save_rollups(self, path: str) -> None:
+        """Write every rollup to one compressed .npz file, replacing any old one atomically"""
+        dates = self.daily_array[0]
+        arrays = {}
+        for name, (labels, array) in self.rollups.items():
+            arrays[name] = array
+            if not name.endswith('_count'):
+                arrays[f'{name}_labels'] = np.array(labels, dtype=str)
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                format_version=np.array(ROLLUPS_FORMAT_VERSION),
+                countries=np.array(list(self.countries), dtype=str),
+                indicators=np.array(INDICATORS, dtype=str),
+                start=np.array(DAILY_START, dtype='datetime64[D]'),
+                days=np.array(len(dates)),
+                **arrays,
+            )
+        os.replace(path + ".tmp", path)
+
+    def extract_rollup_data(self, name: str) -> pd.DataFrame:
+        """One rollup as a long frame, sorted by country then bucket like extract_monthly_data
+
+        Calendar periods also get the alert count columns.
+        """
+        key = 'date' if name.startswith('rolling_') else name
+        count_columns = COUNT_COLUMNS if f'{name}_count' in self.rollups else []
+        if name not in self.rollups:
+            return pd.DataFrame(columns=['country', key, *INDICATORS, *count_columns])
+        labels, array = self.rollups[name]
+        order = np.argsort(self.countries.to_numpy(dtype=object), kind='stable')
+        frame = pd.DataFrame({
+            'country': np.repeat(self.countries.to_numpy(dtype=object)[order], len(labels)),
+            key: np.tile(np.asarray(labels, dtype=object), len(order)),
+        })
+        for i, indicator in enumerate(INDICATORS):
+            frame[indicator] = array[order, :, i].ravel().astype(np.int64)
+        if count_columns:
+            counts = self.rollups[f'{name}_count'][1]
+            for i, column in enumerate(count_columns):
+                frame[column] = counts[order, :, i].ravel()
+        return frame
+
     @property
     def extract_monthly_data(self) -> pd.DataFrame:
-        daily = self.extract_daily_data.copy()
-        daily['month'] = daily['date'].dt.to_period('M').astype(str)
-        monthly = daily.groupby(['country', 'month'])[['protest', 'suppression', 'anticipated']].max().reset_index()
-        return monthly
\ No newline at end of file
+        # Sorted by country then month, as the groupby it replaces
+        return self.extract_rollup_data('month')
+
@@ -1,25 +1,77 @@
-from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, make_response, redirect, url_for, g, has_request_context
 from matplotlib.figure import Figure
 import pandas as pd
 from flask import  abort
+from werkzeug.exceptions import ServiceUnavailable
 import matplotlib
 matplotlib.use('Agg')  # Set the backend to Agg for non-interactive plotting
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.patches import Circle
 from matplotlib.collections import PatchCollection
 import matplotlib.gridspec as gridspec
+import matplotlib.image as mpimg
 from datetime import datetime
 import numpy as np
-from matplotlib.colors import ListedColormap
+from matplotlib.colors import ListedColormap, LogNorm
+from matplotlib.ticker import MaxNLocator
+from matplotlib.patches import Patch
+from matplotlib.markers import MarkerStyle
 import io
-import base64
 import os
+import signal
+import multiprocessing
+import threading
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from cube import IndicatorCube, INDICATORS, COUNT_COLUMNS, PREVENTIVENESS_LUT, PROTEST, ANTICIPATED, SUPPRESSION, RANGE_BUCKETS, bucket_count, BAR_CATEGORY_LABELS
+from render_cache import RenderCache, RenderTimeout
+from svg_chart import render_monthly_svg, render_preventiveness_svg
+from metrics import metrics, timed_call
+import time
+from typing import NamedTuple
 # Constants
 COUNTRY_PATH = "ISO_country_names.txt"
+REGION_PATH = "ISO_country_regions.txt"
 OSAC_DAILY_PATH = "OSAC_daily.csv"
 OSAC_MONTHLY_PATH = "OSAC_monthly.csv"
+OSAC_SNAPSHOT_PATH = "OSAC_cube.bin"
+OSAC_EVENTS_PATH = "OSAC_events.npz"
 DEFAULT_COUNTRY = "United States of America"
 DEFAULT_PERIOD = "monthly"
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Renders in progress are shared between gunicorn workers through this directory
+RENDER_SHARED_DIR = "OSAC_renders"
+CHART_MAX_AGE = 365 * 24 * 60 * 60
+ASSET_MAX_AGE = 24 * 60 * 60
+# Chart backends: matplotlib PNG or the vectorized SVG renderer
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_CHART_FORMAT = "png"
+# Days OR-ed together per bar in the daily view
+DAILY_BUCKETS = (1, 2, 7)
+DEFAULT_DAILY_BUCKET = 2
+# Upper bound on bars for ?start=&end=&bucket= range queries
+MAX_RANGE_BUCKETS = 400
+DEFAULT_REGION = "World"
+DEFAULT_OVERVIEW_MONTHS = 12
+# Heatmap cell colors per bar category; lighter tints stand for circle bars
+HEATMAP_COLORS = ['white', '#c8c8c8', '#9fd49f', 'gray', 'green']
+HEATMAP_SORTS = ["name", "activity"]
+# Cells shaded by bar category, or by how many alerts flagged a protest
+HEATMAP_SHADES = ["category", "intensity"]
+HEATMAP_INTENSITY_CMAP = "YlOrRd"
+# Digit markers of the preventiveness chart, laid out once: matplotlib's
+# mathtext parser is shared and not safe to call from several threads
+PREVENTIVENESS_MARKERS = {digit: MarkerStyle(f'${digit}$') for digit in (0, 1)}
+# matplotlib renders run in a per-worker process pool, off the request threads.
+# At most RENDER_QUEUE_DEPTH renders may be queued or running; beyond that, and
+# past RENDER_TIMEOUT seconds, requests get a 503 with Retry-After
+RENDER_POOL_WORKERS = min(4, os.cpu_count() or 1)
+RENDER_QUEUE_DEPTH = 12
+RENDER_TIMEOUT = 20
+RENDER_RETRY_AFTER = 5
+MAX_COMPARE_COUNTRIES = 12
+# Seconds between checks of the data files for a new version
+DATA_POLL_INTERVAL = 30
 
 class DataParser:
 
@@ -137,9 +189,8 @@ class DataParser:
             )
         
         # Calculate preventiveness
-        df['index of preventiveness'] = df.apply(
-            DataParser.calculate_preventiveness, 
-            axis=1
+        df['index of preventiveness'] = DataParser.preventiveness_index(
+            df['protest'], df['anticipated'], df['suppression']
         )
         
         # Rename columns (optional)
@@ -231,8 +282,61 @@ class DataParser:
         elif (p, a, s) in [(1, 0, 0), (0, 1, 0), (0, 0, 1)]:
             DataParser.draw_circle_bar(ax, 'gray')
     @staticmethod
+    def plot_region_overview(df, ax):
+        """Grouped bars of how many countries had each indicator per month"""
+        bars = [
+            ('protest', 'Any Protest', 'gray'),
+            ('anticipated', 'Any Anticipated Protest', 'black'),
+            ('suppression', 'Any Suppressed Protest', 'green'),
+        ]
+        width = 0.27
+        x = np.arange(len(df))
+        for i, (column, label, color) in enumerate(bars):
+            ax.bar(x + (i - 1) * width, df[column], width=width, color=color, label=label)
+        # Keep at most ~12 month labels readable on long windows
+        step = -(-len(df) // 12)
+        ax.set_xlim(-0.5, len(df) - 0.5)
+        ax.set_xticks(x[::step])
+        ax.set_xticklabels(pd.DatetimeIndex(df['month'])[::step].strftime('%b\n%Y'), fontsize=9)
+        ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.set_ylabel('Countries', fontsize=9)
+        ax.legend(fontsize=8, loc='lower left', bbox_to_anchor=(0, 1), ncol=3, frameon=False)
+    @staticmethod
+    def plot_heatmap(categories, countries, months, ax):
+        """Every country x month as one image of fast_plot_monthly's bar categories"""
+        ax.imshow(categories, cmap=ListedColormap(HEATMAP_COLORS), vmin=0,
+                  vmax=len(HEATMAP_COLORS) - 1, aspect='auto', interpolation='nearest')
+        step = -(-len(months) // 12)
+        ax.set_xticks(range(0, len(months), step))
+        ax.set_xticklabels(pd.DatetimeIndex(months)[::step].strftime('%b\n%Y'), fontsize=7)
+        ax.set_yticks(range(len(countries)))
+        ax.set_yticklabels(countries, fontsize=5)
+        ax.xaxis.tick_top()
+        handles = [Patch(facecolor=color, edgecolor='black', linewidth=0.3, label=label.replace('\n', ' '))
+                   for color, label in zip(HEATMAP_COLORS[1:], BAR_CATEGORY_LABELS[1:])]
+        ax.legend(handles=handles, fontsize=6, loc='upper left', bbox_to_anchor=(1.01, 1), frameon=False)
+    @staticmethod
+    def plot_intensity_heatmap(counts, countries, months, ax):
+        """Every country x month shaded by its protest alert count, on a log scale"""
+        cmap = matplotlib.colormaps[HEATMAP_INTENSITY_CMAP].with_extremes(bad='white')
+        vmax = max(int(counts.max()), 2)
+        image = ax.imshow(np.ma.masked_equal(counts, 0), cmap=cmap, norm=LogNorm(vmin=1, vmax=vmax),
+                          aspect='auto', interpolation='nearest')
+        step = -(-len(months) // 12)
+        ax.set_xticks(range(0, len(months), step))
+        ax.set_xticklabels(pd.DatetimeIndex(months)[::step].strftime('%b\n%Y'), fontsize=7)
+        ax.set_yticks(range(len(countries)))
+        ax.set_yticklabels(countries, fontsize=5)
+        ax.xaxis.tick_top()
+        ticks = np.unique(np.geomspace(1, vmax, 5).round().astype(int))
+        colorbar = ax.figure.colorbar(image, ax=ax, location='right', fraction=0.03, pad=0.01, anchor=(0, 1), shrink=0.3,
+                                      ticks=ticks, format='%d')
+        colorbar.minorticks_off()
+        colorbar.set_label('Protest alerts', fontsize=6)
+        colorbar.ax.tick_params(labelsize=6)
+    @staticmethod
     def example_generator():
-        fig = plt.figure(figsize=(2, 4))  # You can tweak the figure size
+        fig = Figure(figsize=(2, 4))  # You can tweak the figure size
 
         data = [
             (0, 0, 1),
@@ -247,7 +351,7 @@ class DataParser:
             "Any Anticipated,\nAny Suppressed",
         ]
 
-        gs = gridspec.GridSpec(len(data)*2 + 1, 1, 
+        gs = gridspec.GridSpec(len(data)*2 + 1, 1, figure=fig,
                             height_ratios=[0.3] + [0.8, 0.3]*len(data),
                             hspace=0.1)
 
@@ -267,23 +371,26 @@ class DataParser:
 
         return fig
     @staticmethod
+    def preventiveness_index(protest, anticipated, suppression) -> np.ndarray:
+        """Vectorized calculate_preventiveness through the 3-bit lookup table"""
+        code = (
+            np.where(np.asarray(protest) == 1, PROTEST, 0)
+            | np.where(np.asarray(anticipated) == 1, ANTICIPATED, 0)
+            | np.where(np.asarray(suppression) == 1, SUPPRESSION, 0)
+        )
+        return PREVENTIVENESS_LUT[code].astype(int)
+    @staticmethod
+    def preventiveness_matrix(df) -> np.ndarray:
+        # Anticipated and suppressed only count alongside a protest
+        any_protest = (df['protest'].to_numpy() == 1).astype(int)
+        any_anticipated = any_protest & (df['anticipated'].to_numpy() == 1)
+        any_suppressed = any_protest & (df['suppression'].to_numpy() == 1)
+        index = DataParser.preventiveness_index(any_protest, any_anticipated, any_suppressed)
+        # Rows follow get_monthy_df_preventiveness_titles()
+        return np.vstack([any_protest, any_anticipated, any_suppressed, index])  # Shape: (4 events × n months)
+    @staticmethod
     def fast_plot_preventiveness(df, ax):
-        # Prepare dataframe
-        df = df.copy()
-        df['Any Protest'] = df['protest']
-        df['Any Anticipated Protest'] = ((df['protest'] == 1) & (df['anticipated'] == 1)).astype(int)
-        df['Any Suppressed Protest'] =  ((df['protest'] == 1) & df['suppression'] == 1).astype(int)
-        df['Index of Preventiveness'] = df.apply(DataParser.calculate_preventiveness, axis=1)
-        df = df[[ 'Any Protest','Any Suppressed Protest','Any Anticipated Protest','Index of Preventiveness']]
-        # df.rename(columns={
-        #     'protest': 'Any Protest',
-        #     'suppression': 'Any Suppressed Protest',
-        #     'anticipated': 'Any Anticipated Protest',
-        # }, inplace=True)
-        
-        # Extract event data and transpose for imshow
-        events = DataParser.get_monthy_df_preventiveness_titles()
-        data_matrix = df[events].values.T  # Shape: (4 events × n months)
+        data_matrix = DataParser.preventiveness_matrix(df)
 
         # Custom colormap: white background only
         cmap = ListedColormap(['white'])
@@ -297,17 +404,14 @@ class DataParser:
             vmax=1
         )
 
-        # Add text annotations
-        for i in range(data_matrix.shape[0]):      # Rows (events)
-            for j in range(data_matrix.shape[1]):  # Columns (months)
-                ax.text(
-                    j, i,
-                    str(data_matrix[i, j]),
-                    ha='center',
-                    va='center',
-                    color='black',
-                    fontsize=10
-                )
+        # Add text annotations: one marker collection per digit instead of one
+        # Text artist per cell. A 10pt digit is about 7.3pt tall.
+        rows, cols = np.indices(data_matrix.shape)
+        for digit in (0, 1):
+            mask = data_matrix == digit
+            if mask.any():
+                ax.scatter(cols[mask], rows[mask], marker=PREVENTIVENESS_MARKERS[digit],
+                           s=7.3 ** 2, color='black', linewidths=0)
 
         # Customize axes
         ax.set_xticks([])
@@ -316,35 +420,143 @@ class DataParser:
         ax.set_yticklabels([],fontsize=9) #
         ax.grid(False)
         
-        # # Automatically adjust layout
-        plt.tight_layout(pad=0)
+        # Layout is left to savefig(bbox_inches='tight'); pyplot's
+        # tight_layout acted on the global current figure, not on ax.figure
         # Remove the graph border
         # for spine in ax.spines.values():
         #     spine.set_visible(False)
 
+class DataBundle(NamedTuple):
+    """Everything derived from one data version, swapped in as a single object"""
+    cube: IndicatorCube
+    modified: datetime
+    region_names: list
+    region_counts: np.ndarray
+    source_mtime: float
+
 class DataManager:
     """Centralized data loading and management"""
     def __init__(self):
-        self.daily_data = None
-        self.monthly_data = None
-        self.load_data()
-    
-    def load_data(self):
-        """Load all required data files"""
+        self.bundle = self.load_data()
+        self.reloads = 0
+
+    # Inside a request these read the bundle the request started with
+    cube = property(lambda self: self.current().cube)
+    modified = property(lambda self: self.current().modified)
+    region_names = property(lambda self: self.current().region_names)
+    region_counts = property(lambda self: self.current().region_counts)
+
+    def current(self) -> DataBundle:
+        """The bundle pinned to the current request, so a reload mid-request cannot mix versions"""
+        if not has_request_context():
+            return self.bundle
+        if 'bundle' not in g:
+            g.bundle = self.bundle
+        return g.bundle
+
+    def load_data(self) -> DataBundle:
+        """Load all required data files into the bit-packed indicator cube"""
+        start = time.perf_counter()
+        # Taken before reading, so a write during the load triggers another one
+        source_mtime = self.source_mtime()
+        cube, modified = self.read_cube()
+        # Region overviews are tiny, precompute them once per data version
+        region_names, region_counts = cube.region_rollups(Helper().get_country_regions())
+        metrics.set_gauge("shiny_data_load_seconds", time.perf_counter() - start)
+        return DataBundle(cube, modified, region_names, region_counts, source_mtime)
+
+    @staticmethod
+    def source_mtime() -> float:
+        paths = [OSAC_SNAPSHOT_PATH, OSAC_EVENTS_PATH, OSAC_DAILY_PATH, OSAC_MONTHLY_PATH]
+        return max((os.path.getmtime(p) for p in paths if os.path.exists(p)), default=0.0)
+
+    def reload(self) -> bool:
+        """Build the new data off to the side, then swap it in with one assignment"""
+        bundle = self.load_data()
+        if bundle.cube.monthly.size == 0 and self.bundle.cube.monthly.size != 0:
+            print("Error reloading data: new data is empty, keeping the current version")
+            return False
+        # Data only grows between runs; a shorter range is most likely a file
+        # read while it was being written
+        if any(new < old for new, old in zip(self.data_end(bundle.cube), self.data_end(self.bundle.cube))):
+            print("Error reloading data: new data ends earlier, keeping the current version")
+            return False
+        # In-flight requests keep the bundle they started with; render caches
+        # roll over by themselves since the generation includes the version
+        self.bundle = bundle
+        self.reloads += 1
+        return True
+
+    @staticmethod
+    def data_end(cube) -> tuple:
+        """(day after the last daily column, month after the last monthly column)"""
+        return (cube.daily_start + cube.daily.shape[1], cube.monthly_start + cube.monthly.shape[1])
+
+    def watch(self, interval=DATA_POLL_INTERVAL):
+        """Poll the data files and reload in a background thread when they change"""
+        def poll():
+            seen = tried = self.bundle.source_mtime
+            while True:
+                time.sleep(interval)
+                mtime = self.source_mtime()
+                # Wait for the mtime to hold still for one interval, parse.py
+                # replaces the files one after another. A version that was
+                # rejected is not loaded again until the files change.
+                if mtime != tried and mtime == seen:
+                    tried = mtime
+                    try:
+                        self.reload()
+                    except Exception as e:
+                        print(f"Error reloading data: {e}")
+                seen = mtime
+        threading.Thread(target=poll, name="data-reload", daemon=True).start()
+
+    def read_cube(self) -> tuple:
+        """(cube, modification time) from the snapshot, the event store or the csv files"""
+        # A snapshot older than the files it is built from (after a git pull,
+        # or a parse.py run that stopped early) would hide the new data
+        sources = [p for p in (OSAC_EVENTS_PATH, OSAC_DAILY_PATH, OSAC_MONTHLY_PATH) if os.path.exists(p)]
+        newest_source = max((os.path.getmtime(p) for p in sources), default=0.0)
+        if os.path.exists(OSAC_SNAPSHOT_PATH) and os.path.getmtime(OSAC_SNAPSHOT_PATH) < newest_source:
+            print("Snapshot is older than the data files, skipping it; run `python cube.py` to rebuild it")
+        elif os.path.exists(OSAC_SNAPSHOT_PATH):
+            try:
+                cube = IndicatorCube.load(OSAC_SNAPSHOT_PATH)
+                return cube, datetime.fromtimestamp(os.path.getmtime(OSAC_SNAPSHOT_PATH))
+            except Exception as e:
+                print(f"Error loading snapshot, falling back to the event store: {e}")
+        if os.path.exists(OSAC_EVENTS_PATH):
+            try:
+                cube = IndicatorCube.from_events(OSAC_EVENTS_PATH)
+                return cube, datetime.fromtimestamp(os.path.getmtime(OSAC_EVENTS_PATH))
+            except Exception as e:
+                print(f"Error loading event store, falling back to csv: {e}")
+        usecols = lambda c: c in {'country', 'date', 'month', *INDICATORS, *COUNT_COLUMNS}
         try:
-            self.daily_data = pd.read_csv(OSAC_DAILY_PATH)
-            self.monthly_data = pd.read_csv(OSAC_MONTHLY_PATH)
+            daily_data = pd.read_csv(OSAC_DAILY_PATH, usecols=usecols)
+            monthly_data = pd.read_csv(OSAC_MONTHLY_PATH, usecols=usecols)
+            cube = IndicatorCube.from_frames(daily_data, monthly_data)
+            return cube, datetime.fromtimestamp(max(
+                os.path.getmtime(OSAC_DAILY_PATH), os.path.getmtime(OSAC_MONTHLY_PATH)))
         except Exception as e:
             print(f"Error loading data: {e}")
-            self.daily_data = pd.DataFrame()
-            self.monthly_data = pd.DataFrame()
+            return IndicatorCube.empty(), datetime.now()
     
+    def get_region_overview(self, region, months, today) -> pd.DataFrame:
+        """Countries per month with any protest, anticipated or suppressed protest"""
+        bundle = self.current()
+        if region not in bundle.region_names or bundle.cube.monthly.shape[1] == 0:
+            return pd.DataFrame()
+        window = bundle.cube.month_window(today, months)
+        counts = bundle.region_counts[bundle.region_names.index(region), :, window]
+        frame = {'month': bundle.cube.monthly_start + np.arange(window.start, window.stop)}
+        frame.update(zip(INDICATORS, counts.astype(int)))
+        return pd.DataFrame(frame)
+
     def get_country_data(self, period, country) -> pd.DataFrame:
         """Get data for specific country and period"""
-        data = self.daily_data if period == "daily" else self.monthly_data
-        if 'country' in data.columns:
-            return data[data['country'] == country]
-        return pd.DataFrame()
+        with metrics.stage("country_data"):
+            return self.cube.country_frame(period, country)
 
 class Helper:
     def __init__(self):
@@ -353,88 +565,689 @@ class Helper:
         with open(COUNTRY_PATH, 'r', encoding='utf-8') as f:
             country_names = [i.split(",,")[0] for i in f.read().splitlines()]
             return country_names
+    def get_country_regions(self):
+        if not os.path.exists(REGION_PATH):
+            return {}
+        with open(REGION_PATH, 'r', encoding='utf-8') as f:
+            return dict(i.split(",,")[:2] for i in f.read().splitlines() if ",," in i)
+
+class AssetRegistry:
+    """Constant images rendered once per process"""
+    def __init__(self):
+        self._assets = {}
+
+    def register(self, name, endpoint, render, mimetype='image/png'):
+        data = render()
+        self._assets[name] = (data, RenderCache.etag(data), mimetype, endpoint)
+
+    def get(self, name) -> tuple:
+        data, etag, mimetype, _ = self._assets[name]
+        return data, etag, mimetype
+
+    def version(self, name) -> str:
+        return self._assets[name][1][:12]
+
+    def url(self, name) -> str:
+        return url_for(self._assets[name][3], v=self.version(name))
 
 
 app = Flask(__name__)
 helper = Helper()
 data_manager = DataManager()
+render_cache = RenderCache(RENDER_CACHE_MAX_BYTES, RENDER_SHARED_DIR, wait_timeout=RENDER_TIMEOUT)
+
+@app.before_request
+def start_timing():
+    init_worker()
+    metrics.begin()
+    g.request_start = time.perf_counter()
+    g.bundle = data_manager.bundle
+
+@app.after_request
+def add_server_timing(response):
+    total = time.perf_counter() - g.request_start
+    metrics.observe("request", request.endpoint or "unmatched", total)
+    timing = metrics.server_timing()
+    response.headers['Server-Timing'] = f"{timing}, total;dur={total * 1000:.1f}" if timing else f"total;dur={total * 1000:.1f}"
+    return response
+
+@app.errorhandler(RenderTimeout)
+def render_timeout(error):
+    # Another worker held the same chart's render for longer than RENDER_TIMEOUT
+    return ServiceUnavailable(description="Chart rendering timed out, try again shortly", retry_after=RENDER_RETRY_AFTER)
+
+def render_generation() -> tuple:
+    """Charts depend on the data version and, through the date windows, on today"""
+    return (data_manager.cube.version, datetime.now().date().isoformat())
+
+def get_chart_options(period) -> dict:
+    """Optional chart parameters from the query string, validated"""
+    options = {}
+    start, end = request.args.get('start'), request.args.get('end')
+    if start or end:
+        # Arbitrary window, answered from the cube's prefix sums
+        cube = data_manager.cube
+        try:
+            first = np.datetime64(start, 'D') if start else cube.daily_start
+            # A partial end date such as 2019 or 2019-06 covers that whole year or month
+            last = (np.datetime64(end) + 1).astype('datetime64[D]') - 1 if end else np.datetime64(datetime.now().date())
+        except (ValueError, OverflowError):
+            abort(400, description="Invalid 'start' or 'end' parameter")
+        if np.isnat(first) or np.isnat(last):
+            abort(400, description="Invalid 'start' or 'end' parameter")
+        bucket = request.args.get('bucket', 'month' if period == "monthly" else 'day')
+        if bucket.isdigit() and int(bucket) > 0:
+            bucket = int(bucket)
+        elif bucket not in RANGE_BUCKETS:
+            abort(400, description="Invalid 'bucket' parameter")
+        # Only days the cube holds can have data; range_window clamps the same way
+        first = max(first, cube.daily_start)
+        last = min(last, cube.daily_start + cube.daily.shape[1] - 1)
+        if first > last or bucket_count(first, last, bucket) > MAX_RANGE_BUCKETS:
+            abort(400, description="Invalid or too long date range")
+        options.update(start=str(first), end=str(last), bucket=bucket)
+    elif period == "daily":
+        bucket = request.args.get('bucket', DEFAULT_DAILY_BUCKET, type=int)
+        if bucket not in DAILY_BUCKETS:
+            abort(400, description="Invalid 'bucket' parameter")
+        options['bucket'] = bucket
+    return options
+
+def get_parsed_data(period, country, **options) -> pd.DataFrame:
+    if 'start' in options:
+        with metrics.stage("window"):
+            return data_manager.cube.range_window(country, options['start'], options['end'], options['bucket'])
+    if period == "daily":
+        # Sliced straight from the cube's day offsets, no date parsing per request
+        bucket = options.get('bucket', DEFAULT_DAILY_BUCKET)
+        with metrics.stage("window"):
+            return data_manager.cube.daily_window(country, datetime.now().date(), bucket=bucket)
+    country_data = data_manager.get_country_data(period, country)
+    if country_data.empty:
+        return pd.DataFrame()
+    with metrics.stage("parse"):
+        return DataParser.monthly_df_parsed(country_data)
+
+def figure_to_png(fig, **kwargs) -> bytes:
+    """Render through a private Agg canvas, never through pyplot's global state"""
+    FigureCanvasAgg(fig)
+    buf = io.BytesIO()
+    with metrics.stage("savefig"):
+        fig.savefig(buf, format='png', **kwargs)
+    return buf.getvalue()
+
+def plot_chart_png(parsed_df) -> bytes:
+    """Pure matplotlib step of render_chart, safe to run in the render pool"""
+    if parsed_df.empty:
+        return b""
+    fig = Figure(figsize=(10, 5))
+    ax = fig.add_subplot(1, 1, 1)
+    with metrics.stage("plot"):
+        DataParser.fast_plot_monthly(parsed_df, ax)
+    return figure_to_png(fig, bbox_inches='tight', pad_inches=0.02)
+
+def render_chart(period, country, fmt="png", **options) -> bytes:
+    parsed_df = get_parsed_data(period, country, **options)
+    if parsed_df.empty:
+        return b""
+    if fmt == "svg":
+        return render_monthly_svg(parsed_df).encode('utf-8')
+    return run_render(plot_chart_png, parsed_df)
+
+def plot_preventiveness_png(parsed_df) -> bytes:
+    fig = Figure(figsize=(10, 2))
+    ax = fig.add_subplot(1, 1, 1)
+    with metrics.stage("plot"):
+        DataParser.fast_plot_preventiveness(parsed_df, ax)
+    return figure_to_png(fig, bbox_inches="tight", pad_inches=0.01)
+
+def render_preventiveness(country, fmt="png", **options) -> bytes:
+    parsed_df = get_parsed_data("monthly", country, **options)
+    if parsed_df.empty:
+        return b""
+    if fmt == "svg":
+        return render_preventiveness_svg(DataParser.preventiveness_matrix(parsed_df)).encode('utf-8')
+    return run_render(plot_preventiveness_png, parsed_df)
+
+def get_chart(kind, period, country, fmt="png", **options) -> tuple:
+    """(image bytes, etag) of a chart, served from the render cache when possible"""
+    if kind == "preventiveness":
+        render = lambda: render_preventiveness(country, fmt, **options)
+    else:
+        render = lambda: render_chart(period, country, fmt, **options)
+    return render_cache.get_or_render(chart_key(kind, period, country, fmt, options), render_generation(), render)
+
+def chart_key(kind, period, country, fmt, options) -> tuple:
+    return (kind, period, country, fmt, tuple(sorted(options.items())))
+
+render_pool = None
+render_pool_lock = threading.Lock()
+render_slots = threading.BoundedSemaphore(RENDER_QUEUE_DEPTH)
+
+render_pool_resets = 0
+
+def note_render_pid(pids):
+    """Pool initializer: record this render process's PID, so that a hung one can be killed"""
+    with pids.get_lock():
+        pids[list(pids).index(0)] = os.getpid()
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound renders, started by init_worker and again after a reset"""
+    global render_pool
+    with render_pool_lock:
+        if render_pool is None:
+            # Forked children inherit the imported modules, so only the parsed
+            # frames travel to them and the rendered bytes come back. Forking
+            # is only safe before the request threads start; replacements come
+            # from a forkserver that has imported the app without them.
+            if render_pool_resets:
+                context = multiprocessing.get_context("forkserver")
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context("fork")
+            pids = context.Array('l', RENDER_POOL_WORKERS)
+            render_pool = ProcessPoolExecutor(RENDER_POOL_WORKERS, mp_context=context,
+                                              initializer=note_render_pid, initargs=(pids,))
+            render_pool.render_pids = pids
+        return render_pool
+
+def submit_render(func, *args):
+    """Queue func(*args) on the render pool, or answer 503 when the queue is full"""
+    if not render_slots.acquire(blocking=False):
+        abort(503, description="Too many charts rendering, try again shortly", retry_after=RENDER_RETRY_AFTER)
+    pool = get_render_pool()
+    try:
+        future = pool.submit(timed_call, func, *args)
+    except BrokenProcessPool:
+        render_slots.release()
+        reset_render_pool(pool)
+        abort(503, description="Chart renderer restarting, try again shortly", retry_after=RENDER_RETRY_AFTER)
+    future.render_pool = pool
+    # The slot is held until the render finishes or its process is killed,
+    # even if its request gave up
+    future.add_done_callback(lambda _: render_slots.release())
+    return future
+
+def await_render(future) -> bytes:
+    try:
+        with metrics.stage("render"):
+            data, timings = future.result(timeout=RENDER_TIMEOUT)
+        # Stages timed inside the render process count towards this request
+        metrics.record_all(timings)
+        return data
+    except FutureTimeout:
+        # A render still running after RENDER_TIMEOUT is likely stuck; only
+        # killing its process frees that process and its queue slot
+        if not future.cancel():
+            reset_render_pool(future.render_pool, terminate=True)
+        abort(503, description="Chart rendering timed out, try again shortly", retry_after=RENDER_RETRY_AFTER)
+    except (BrokenProcessPool, CancelledError):
+        # Cancelled when another request dropped the pool it was queued on
+        reset_render_pool(future.render_pool)
+        abort(503, description="Chart renderer restarting, try again shortly", retry_after=RENDER_RETRY_AFTER)
+
+def run_render(func, *args) -> bytes:
+    return await_render(submit_render(func, *args))
+
+def reset_render_pool(pool=None, terminate=False):
+    """Drop a pool whose process died or hung; the next render starts a fresh one
+
+    Only `pool` is dropped, if given, so that requests failing on the same
+    pool do not drop its replacement. terminate kills its processes as well,
+    which fails their renders and frees their queue slots.
+    """
+    global render_pool, render_pool_resets
+    with render_pool_lock:
+        if pool is not None and pool is not render_pool:
+            return
+        old, render_pool = render_pool, None
+        render_pool_resets += 1
+    if old is None:
+        return
+    if terminate:
+        for pid in filter(None, old.render_pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    old.shutdown(wait=False, cancel_futures=True)
+
+def get_chart_strips(period, countries, options) -> list:
+    """PNG chart per country: cached ones as they are, the rest rendered in parallel"""
+    generation = render_generation()
+    keys = [chart_key("chart", period, country, "png", options) for country in countries]
+    strips = [render_cache.get(key, generation) for key in keys]
+    frames = {i: get_parsed_data(period, countries[i], **options) for i, strip in enumerate(strips) if strip is None}
+    futures = {}
+    try:
+        for i, df in frames.items():
+            futures[i] = submit_render(plot_chart_png, df)
+        for i, future in futures.items():
+            strips[i] = render_cache.put(keys[i], generation, await_render(future))
+    finally:
+        # Free the queue slots of a comparison that could not be completed
+        for future in futures.values():
+            future.cancel()
+    return [data for data, _ in strips]
+
+def composite_strips(strips, labels, title_px=22, dpi=100) -> bytes:
+    """Stack rendered PNGs under their labels pixel for pixel, without resampling"""
+    images = [mpimg.imread(io.BytesIO(data)) for data in strips]
+    width = max(image.shape[1] for image in images)
+    height = sum(image.shape[0] + title_px for image in images)
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    top = height
+    for image, label in zip(images, labels):
+        fig.text(4 / width, (top - title_px / 2) / height, label, va='center', fontsize=11)
+        top -= title_px + image.shape[0]
+        fig.figimage(image, xo=0, yo=top)
+    return figure_to_png(fig, dpi=dpi)
+
+def render_comparison(period, countries, options) -> bytes:
+    strips = get_chart_strips(period, countries, options)
+    # Every country shares the cube's date axis, so the strips line up
+    shown = [(data, country) for data, country in zip(strips, countries) if data]
+    if not shown:
+        return b""
+    return run_render(composite_strips, *zip(*shown))
+
+def render_example_plot() -> bytes:
+    fig = DataParser.example_generator()
+    return figure_to_png(fig, bbox_inches='tight')
+
+def render_preventiveness_sample() -> bytes:
+    # Sample data (replace this with actual data)
+    df = pd.DataFrame({
+        'protest': [0, 1, 0, 1],
+        'suppression': [0, 0, 1, 1],
+        'anticipated': [1, 0, 1, 1]
+    })
+
+    fig = Figure(figsize=(10, 2))
+    ax = fig.add_subplot(1, 1, 1)
+
+    DataParser.fast_plot_preventiveness(df, ax)
+    return figure_to_png(fig, bbox_inches="tight")
+
+# These images never change, render them once when the worker starts
+assets = AssetRegistry()
+assets.register("example_plot", "serve_plot", render_example_plot)
+assets.register("preventiveness_plot", "serve_preventiveness_plot", render_preventiveness_sample)
+
+def serve_asset(name) -> Response:
+    data, etag, mimetype = assets.get(name)
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    if request.args.get('v') == assets.version(name):
+        response.cache_control.max_age = CHART_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = ASSET_MAX_AGE
+    return response.make_conditional(request)
+
+def not_modified(etag) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+def chart_version() -> str:
+    """Short token for the current render generation, embedded in chart urls"""
+    return RenderCache.etag(repr(render_generation()).encode('utf-8'))[:12]
+
+def chart_url(kind, period, country, fmt="png", **options) -> str:
+    endpoint = "serve_preventiveness_chart" if kind == "preventiveness" else "serve_chart"
+    return url_for(endpoint, period=period, country=country, fmt=fmt, v=chart_version(), **options)
+
+def validate_chart_args(period, country):
+    if country not in helper.get_country_names() or period not in ["daily", "monthly"]:
+        abort(400, description="Invalid or tampered 'country' parameter")
+
+def serve_chart_bytes(kind, period, country, fmt, options) -> Response:
+    # Versioned urls never change content; stale or missing versions are
+    # redirected to the current one instead of being cached forever
+    if request.args.get('v') != chart_version():
+        response = redirect(chart_url(kind, period, country, fmt, **options))
+        response.cache_control.no_cache = True
+        return response
+    data, etag = get_chart(kind, period, country, fmt, **options)
+    if not data:
+        abort(404, description="No data for this country and period")
+    return immutable_response(data, etag, CHART_FORMATS[fmt])
+
+def immutable_response(data, etag, mimetype) -> Response:
+    response = Response(data, mimetype=mimetype)
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = CHART_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
 @app.route('/')
 def home():
     country_names = helper.get_country_names()
     period = request.args.get('period',DEFAULT_PERIOD)
     country = request.args.get('country',DEFAULT_COUNTRY)
+    fmt = request.args.get('format', DEFAULT_CHART_FORMAT)
     if (country != None and country not in country_names) or period not in ["daily", "monthly"]:
         abort(400, description="Invalid or tampered 'country' parameter")
-    country_data = data_manager.get_country_data(period, country)
-    if not country_data.empty:
-        if period=="monthly":
-            parsed_df = DataParser.monthly_df_parsed(country_data)
-        elif period == "daily":
-            parsed_df = DataParser.daily_df_parsed(country_data)
-    else:
-        parsed_df = pd.DataFrame()
-    # --- Generate chart only if valid dataframe ---
-    img_data = None
-    img_data_bottom = None
-    if not parsed_df.empty:
-        fig = Figure(figsize=(10, 5))
-        ax = fig.add_subplot(1, 1, 1)
-        DataParser.fast_plot_monthly(parsed_df, ax)
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', bbox_inches='tight', pad_inches=0.02)
-        buf.seek(0)
-        img_data = base64.b64encode(buf.read()).decode('utf-8')
-        #-- genrate chart 2 buttom ====
-        if period=="monthly":
-            fig = Figure(figsize=(10, 2))
-            ax = fig.add_subplot(1, 1, 1)
-
-            DataParser.fast_plot_preventiveness(parsed_df, ax)
-
-            # Save to BytesIO and return as image
-            buf = io.BytesIO()
-            fig.savefig(buf, format="png", bbox_inches="tight",pad_inches=0.01)
-            buf.seek(0)
-            img_data_bottom = base64.b64encode(buf.read()).decode('utf-8')
+    if fmt not in CHART_FORMATS:
+        abort(400, description="Invalid 'format' parameter")
+    options = get_chart_options(period)
+    # The page is fully determined by its inputs, so revalidation needs no render
+    generation = render_generation()
+    page_etag = RenderCache.etag(repr((generation, period, country, fmt, options)).encode('utf-8'))
+    if request.if_none_match.contains(page_etag):
+        return not_modified(page_etag)
+    # Charts are fetched by the browser from their own cacheable urls
+    has_chart = not get_parsed_data(period, country, **options).empty
     context = {
         "selected_country_name" : DEFAULT_COUNTRY,
         "country_names" : country_names,
-        "img_data" : img_data,
-        "img_data_bottom" : img_data_bottom,
+        "chart_url" : chart_url("chart", period, country, fmt, **options) if has_chart else None,
+        "chart_url_bottom" : chart_url("preventiveness", period, country, fmt, **options) if has_chart and period == "monthly" else None,
+        "example_plot_url" : assets.url("example_plot"),
         "is_month" : True if period == "monthly" else False
     }
-    return render_template('index.html',**context)
+    with metrics.stage("template"):
+        page = render_template('index.html',**context)
+    response = make_response(page)
+    response.set_etag(page_etag)
+    response.cache_control.no_cache = True
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    response.last_modified = max(data_manager.modified, today)
+    return response.make_conditional(request)
+
+@app.route('/plot/<period>/<country>.<any(png, svg):fmt>')
+def serve_chart(period, country, fmt):
+    validate_chart_args(period, country)
+    return serve_chart_bytes("chart", period, country, fmt, get_chart_options(period))
+
+@app.route('/plot/<period>/<country>/preventiveness.<any(png, svg):fmt>')
+def serve_preventiveness_chart(period, country, fmt):
+    validate_chart_args(period, country)
+    if period != "monthly":
+        abort(404, description="The preventiveness chart is only available monthly")
+    return serve_chart_bytes("preventiveness", period, country, fmt, get_chart_options(period))
+
+def series_payload(period, country, **options) -> dict:
+    """Columnar indicator arrays of one country, windowed like its chart"""
+    parsed_df = get_parsed_data(period, country, **options)
+    if parsed_df.empty:
+        return {"dates": [], "protest": [], "anticipated": [], "suppression": [], "preventiveness": []}
+    fmt = '%Y-%m' if period == "monthly" and 'start' not in options else '%Y-%m-%d'
+    payload = {
+        "dates": parsed_df['date'].dt.strftime(fmt).tolist(),
+        "protest": parsed_df['protest'].astype(int).tolist(),
+        "anticipated": parsed_df['anticipated'].astype(int).tolist(),
+        "suppression": parsed_df['suppression'].astype(int).tolist(),
+        "preventiveness": DataParser.preventiveness_matrix(parsed_df)[3].astype(int).tolist(),
+    }
+    # Range queries also report how many days of each bucket had the indicator
+    for column in ['protest_days', 'anticipated_days', 'suppression_days']:
+        if column in parsed_df:
+            payload[column] = parsed_df[column].astype(int).tolist()
+    return payload
+
+@app.route('/api/series')
+def api_series():
+    period = request.args.get('period', DEFAULT_PERIOD)
+    countries = request.args.getlist('country') or [DEFAULT_COUNTRY]
+    country_names = set(helper.get_country_names())
+    if period not in ["daily", "monthly"] or any(c not in country_names for c in countries):
+        abort(400, description="Invalid or tampered 'country' or 'period' parameter")
+    countries = list(dict.fromkeys(countries))
+    options = get_chart_options(period)
+    generation = render_generation()
+    etag = RenderCache.etag(repr((generation, period, countries, options)).encode('utf-8'))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    # Every country shares the same date axis, so dates are sent once
+    series = {country: series_payload(period, country, **options) for country in countries}
+    dates = next((s.pop("dates") for s in series.values() if s["dates"]), [])
+    for s in series.values():
+        s.pop("dates", None)
+    response = jsonify({
+        "version": generation[0],
+        "period": period,
+        "dates": dates,
+        "series": series,
+    })
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def parse_country_list(values) -> list:
+    """Countries from repeated or comma separated parameters; names may contain commas"""
+    country_names = set(helper.get_country_names())
+    countries = []
+    for value in values:
+        tokens = value.split(',')
+        start = 0
+        while start < len(tokens):
+            # Longest run of tokens that forms a known name wins
+            for stop in range(len(tokens), start, -1):
+                name = ','.join(tokens[start:stop]).strip()
+                if name in country_names:
+                    break
+            else:
+                abort(400, description="Invalid or tampered 'countries' parameter")
+            countries.append(name)
+            start = stop
+    return list(dict.fromkeys(countries))
+
+@app.route('/compare')
+def compare():
+    period = request.args.get('period', DEFAULT_PERIOD)
+    countries = parse_country_list(request.args.getlist('countries'))
+    if period not in ["daily", "monthly"] or not 0 < len(countries) <= MAX_COMPARE_COUNTRIES:
+        abort(400, description="Invalid 'period' or number of countries")
+    options = get_chart_options(period)
+    generation = render_generation()
+    etag = RenderCache.etag(repr((generation, "compare", period, countries, options)).encode('utf-8'))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    key = ("compare", period, tuple(countries), tuple(sorted(options.items())))
+    data, _ = render_cache.get_or_render(key, generation, lambda: render_comparison(period, countries, options))
+    if not data:
+        abort(404, description="No data for these countries and period")
+    response = Response(data, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def get_overview_args() -> tuple:
+    region = request.args.get('region', DEFAULT_REGION)
+    months = request.args.get('months', DEFAULT_OVERVIEW_MONTHS, type=int)
+    if region not in data_manager.region_names:
+        abort(400, description="Invalid 'region' parameter")
+    if not 1 <= months <= MAX_RANGE_BUCKETS:
+        abort(400, description="Invalid 'months' parameter")
+    return region, months
+
+def render_overview(region, months) -> bytes:
+    df = data_manager.get_region_overview(region, months, datetime.now().date())
+    if df.empty:
+        return b""
+    return run_render(plot_region_overview_png, df)
+
+def plot_region_overview_png(df) -> bytes:
+    fig = Figure(figsize=(10, 4))
+    ax = fig.add_subplot(1, 1, 1)
+    with metrics.stage("plot"):
+        DataParser.plot_region_overview(df, ax)
+    return figure_to_png(fig, bbox_inches='tight', pad_inches=0.02)
+
+@app.route('/overview')
+def overview():
+    region, months = get_overview_args()
+    generation = render_generation()
+    etag = RenderCache.etag(repr((generation, region, months)).encode('utf-8'))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    df = data_manager.get_region_overview(region, months, datetime.now().date())
+    context = {
+        "region_names" : data_manager.region_names,
+        "selected_region" : region,
+        "months" : months,
+        "chart_url" : url_for("serve_overview_chart", region=region, months=months, v=chart_version()) if not df.empty else None,
+        "rows" : [] if df.empty else zip(
+            pd.DatetimeIndex(df['month']).strftime('%b %Y'), df['protest'], df['anticipated'], df['suppression']),
+    }
+    with metrics.stage("template"):
+        page = render_template('overview.html', **context)
+    response = make_response(page)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/overview/plot/<region>.png')
+def serve_overview_chart(region):
+    if region not in data_manager.region_names:
+        abort(400, description="Invalid 'region' parameter")
+    months = request.args.get('months', DEFAULT_OVERVIEW_MONTHS, type=int)
+    if not 1 <= months <= MAX_RANGE_BUCKETS:
+        abort(400, description="Invalid 'months' parameter")
+    if request.args.get('v') != chart_version():
+        response = redirect(url_for("serve_overview_chart", region=region, months=months, v=chart_version()))
+        response.cache_control.no_cache = True
+        return response
+    data, etag = render_cache.get_or_render(
+        ("overview", region, months), render_generation(), lambda: render_overview(region, months))
+    if not data:
+        abort(404, description="No data for this region")
+    return immutable_response(data, etag, 'image/png')
+
+@app.route('/api/overview')
+def api_overview():
+    region, months = get_overview_args()
+    generation = render_generation()
+    etag = RenderCache.etag(repr((generation, region, months)).encode('utf-8'))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    df = data_manager.get_region_overview(region, months, datetime.now().date())
+    response = jsonify({
+        "version": generation[0],
+        "region": region,
+        "months": [] if df.empty else pd.DatetimeIndex(df['month']).strftime('%Y-%m').tolist(),
+        **{column: [] if df.empty else df[column].tolist() for column in ['protest', 'anticipated', 'suppression']},
+    })
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+def get_heatmap_args() -> tuple:
+    months = request.args.get('months', DEFAULT_OVERVIEW_MONTHS, type=int)
+    sort = request.args.get('sort', HEATMAP_SORTS[0])
+    shade = request.args.get('shade', HEATMAP_SHADES[0])
+    if not 1 <= months <= MAX_RANGE_BUCKETS or sort not in HEATMAP_SORTS or shade not in HEATMAP_SHADES:
+        abort(400, description="Invalid 'months', 'sort' or 'shade' parameter")
+    return months, sort, shade
+
+def render_heatmap(months, sort, shade) -> bytes:
+    cube = data_manager.cube
+    if cube.monthly.shape[1] == 0:
+        return b""
+    today = datetime.now().date()
+    if shade == "intensity":
+        cells = cube.alert_counts(today, months)
+        activity = cells.sum(axis=1, dtype=np.int64)
+    else:
+        cells = cube.bar_categories(today, months)
+        activity = (cells != 0).sum(axis=1)
+    window = cube.month_window(today, months)
+    order = np.argsort(np.array(cube.countries, dtype=object), kind='stable')
+    if sort == "activity":
+        # Most active first, names break ties
+        order = order[np.argsort(-activity[order], kind='stable')]
+    return run_render(plot_heatmap_png, cells[order], [cube.countries[i] for i in order],
+                      cube.monthly_start + np.arange(window.start, window.stop), shade)
+
+def plot_heatmap_png(cells, countries, months, shade=HEATMAP_SHADES[0]) -> bytes:
+    fig = Figure(figsize=(10, max(4, 0.1 * len(countries))))
+    ax = fig.add_subplot(1, 1, 1)
+    with metrics.stage("plot"):
+        if shade == "intensity":
+            DataParser.plot_intensity_heatmap(cells, countries, months, ax)
+        else:
+            DataParser.plot_heatmap(cells, countries, months, ax)
+    return figure_to_png(fig, bbox_inches='tight', pad_inches=0.02)
+
+@app.route('/heatmap')
+def heatmap():
+    months, sort, shade = get_heatmap_args()
+    etag = RenderCache.etag(repr((render_generation(), months, sort, shade)).encode('utf-8'))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    context = {
+        "months" : months,
+        "sort" : sort,
+        "shade" : shade,
+        "chart_url" : url_for("serve_heatmap_chart", months=months, sort=sort, shade=shade, v=chart_version()),
+    }
+    with metrics.stage("template"):
+        page = render_template('heatmap.html', **context)
+    response = make_response(page)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/heatmap/plot.png')
+def serve_heatmap_chart():
+    months, sort, shade = get_heatmap_args()
+    if request.args.get('v') != chart_version():
+        response = redirect(url_for("serve_heatmap_chart", months=months, sort=sort, shade=shade, v=chart_version()))
+        response.cache_control.no_cache = True
+        return response
+    data, etag = render_cache.get_or_render(
+        ("heatmap", months, sort, shade), render_generation(), lambda: render_heatmap(months, sort, shade))
+    if not data:
+        abort(404, description="No data loaded")
+    return immutable_response(data, etag, 'image/png')
+
+@app.route('/metrics')
+def serve_metrics():
+    lookups = render_cache.hits + render_cache.misses
+    text = metrics.render({
+        "shiny_render_cache_hits_total": render_cache.hits,
+        "shiny_render_cache_misses_total": render_cache.misses,
+        "shiny_render_cache_coalesced_total": render_cache.coalesced,
+        "shiny_render_cache_hit_ratio": round(render_cache.hits / lookups, 4) if lookups else 0,
+        "shiny_render_cache_entries": len(render_cache),
+        "shiny_render_cache_bytes": render_cache.size,
+        "shiny_data_reloads_total": data_manager.reloads,
+    })
+    response = Response(text, mimetype='text/plain; version=0.0.4')
+    response.cache_control.no_store = True
+    return response
 
 @app.route('/example_plot')
 def serve_plot():
-    fig = DataParser.example_generator()
-    output = io.BytesIO()
-    fig.savefig(output, format='png', bbox_inches='tight')
-    plt.close(fig)  # Prevent memory leaks
-    output.seek(0)
-    return Response(output.getvalue(), mimetype='image/png')
+    return serve_asset("example_plot")
 
 @app.route("/preventiveness_plot")
 def serve_preventiveness_plot():
-    # Sample data (replace this with actual data)
-    df = pd.DataFrame({
-        'protest': [0, 1, 0, 1],
-        'suppression': [0, 0, 1, 1],
-        'anticipated': [1, 0, 1, 1]
-    })
-
-    fig = Figure(figsize=(10, 2))
-    ax = fig.add_subplot(1, 1, 1)
+    return serve_asset("preventiveness_plot")
 
-    DataParser.fast_plot_preventiveness(df, ax)
+worker_started = False
+worker_start_lock = threading.Lock()
 
-    # Save to BytesIO and return as image
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    buf.seek(0)
-    return send_file(buf, mimetype='image/png')
+def init_worker():
+    """Fork the render processes and start polling the data files, once per process
 
+    gunicorn.conf.py calls this once the worker has imported the app and
+    before it starts its request threads; otherwise the first request does.
+    """
+    global worker_started
+    if worker_started:
+        return
+    with worker_start_lock:
+        if worker_started:
+            return
+        get_render_pool().submit(int).result()
+        data_manager.watch()
+        worker_started = True
 
 if __name__ == '__main__':
     #app.run(debug=True)
@@ -0,0 +1,196 @@
+"""Offline load test: start app.py under gunicorn and replay a dashboard traffic mix
+
+    python bench.py --workers 3 --threads 16 --concurrency 32 --requests 2000 > bench.json
+
+Country popularity follows a Zipf law over ISO_country_names.txt, with the
+default country most popular. A page view fetches `/` and then the chart
+images it links to, as a browser would. Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+# Same as app.py; importing app would load the data and fork its render pool
+COUNTRY_PATH = "ISO_country_names.txt"
+DEFAULT_COUNTRY = "United States of America"
+IMAGE_SRC = re.compile(r'<img src="([^"]+)"')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="benchmark a server that is already running instead of starting gunicorn")
+    parser.add_argument("--requests", type=int, default=1000, help="number of page views or image fetches to replay")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of the country popularity skew")
+    parser.add_argument("--daily-share", type=float, default=0.3, help="share of page views on the daily period")
+    parser.add_argument("--example-share", type=float, default=0.1, help="share of direct /example_plot fetches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30)
+    return parser.parse_args()
+
+
+def country_weights(zipf: float, seed: int) -> tuple:
+    """Countries in popularity order with their Zipf weights"""
+    with open(COUNTRY_PATH, 'r', encoding='utf-8') as f:
+        countries = [i.split(",,")[0] for i in f.read().splitlines() if i]
+    rest = [c for c in countries if c != DEFAULT_COUNTRY]
+    random.Random(seed).shuffle(rest)
+    ranked = [DEFAULT_COUNTRY] + rest
+    return ranked, [1 / rank ** zipf for rank in range(1, len(ranked) + 1)]
+
+
+def build_plan(args) -> list:
+    """The request mix, drawn up front so every run with one seed is identical"""
+    rng = random.Random(args.seed)
+    countries, weights = country_weights(args.zipf, args.seed)
+    plan = []
+    for country in rng.choices(countries, weights, k=args.requests):
+        if rng.random() < args.example_share:
+            plan.append(("example", "/example_plot"))
+        else:
+            period = "daily" if rng.random() < args.daily_share else "monthly"
+            plan.append(("page", "/?" + urlencode({"country": country, "period": period})))
+    return plan
+
+
+def start_gunicorn(args) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py",
+        "--workers", str(args.workers), "--threads", str(args.threads),
+        "--worker-class", args.worker_class,
+        "--bind", f"127.0.0.1:{args.port}", "app:app",
+    ]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            urllib.request.urlopen(base + "/example_plot", timeout=5).read()
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("gunicorn did not come up")
+
+
+def fetch(base: str, path: str, timeout: float) -> tuple:
+    """(status, seconds, body) of one GET; redirects are followed like a browser would"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(base + path, timeout=timeout) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body, status = b"", e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        body, status = b"", 0
+    return status, time.perf_counter() - start, body
+
+
+def process_rss(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def child_pids(pid: int) -> list:
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children += [int(child) for child in f.read().split()]
+    return children
+
+
+def worker_memory(master: int) -> list:
+    """RSS of each gunicorn worker and of the render processes it forked"""
+    workers = []
+    for pid in child_pids(master):
+        try:
+            renderers = child_pids(pid)
+            workers.append({
+                "pid": pid,
+                "rss_bytes": process_rss(pid),
+                "render_processes": len(renderers),
+                "render_rss_bytes": sum(process_rss(child) for child in renderers),
+            })
+        except OSError:
+            continue
+    return workers
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def run(args) -> dict:
+    server = None if args.url else start_gunicorn(args)
+    base = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    samples = []
+    lock = threading.Lock()
+
+    def replay(step):
+        kind, path = step
+        status, seconds, body = fetch(base, path, args.timeout)
+        results = [(kind, status, seconds)]
+        if kind == "page" and status == 200:
+            for src in IMAGE_SRC.findall(body.decode("utf-8", "replace")):
+                status, seconds, _ = fetch(base, src.replace("&amp;", "&"), args.timeout)
+                results.append(("image", status, seconds))
+        with lock:
+            samples.extend(results)
+
+    try:
+        plan = build_plan(args)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(replay, plan))
+        elapsed = time.perf_counter() - start
+        memory = worker_memory(server.pid) if server else []
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "config": vars(args),
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "workers": memory,
+        "by_kind": {},
+    }
+    for kind in ["all", "page", "image", "example"]:
+        chosen = [s for s in samples if kind == "all" or s[0] == kind]
+        if not chosen:
+            continue
+        latencies = sorted(seconds for _, _, seconds in chosen)
+        errors = sum(1 for _, status, _ in chosen if status == 0 or status >= 400)
+        report["by_kind"][kind] = {
+            "requests": len(chosen),
+            "error_rate": round(errors / len(chosen), 4),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(parse_args()), indent=2))
@@ -0,0 +1,431 @@
+import hashlib
+import json
+import os
+import struct
+from functools import cached_property, lru_cache
+import numpy as np
+import pandas as pd
+
+# Indicator bits packed into a single uint8 per (country, day) cell
+PROTEST = 1
+ANTICIPATED = 2
+SUPPRESSION = 4
+INDICATORS = {
+    'protest': PROTEST,
+    'anticipated': ANTICIPATED,
+    'suppression': SUPPRESSION,
+}
+COLUMNS = ['protest', 'suppression', 'anticipated']
+# Alerts flagging each indicator per (country, month), in COLUMNS order
+COUNT_COLUMNS = [f'{column}_count' for column in COLUMNS]
+COUNT_DTYPE = np.uint16
+# Index of preventiveness for each 3-bit code, the rule table of
+# DataParser.calculate_preventiveness: 0 only when a protest was anticipated
+PREVENTIVENESS_LUT = np.array([
+    1,  # 000 none
+    1,  # 001 protest
+    1,  # 010 anticipated
+    0,  # 011 protest + anticipated
+    1,  # 100 suppression
+    1,  # 101 protest + suppression
+    1,  # 110 anticipated + suppression
+    0,  # 111 protest + anticipated + suppression
+], dtype=np.uint8)
+
+# Snapshot layout: magic, format version, header length, JSON header, then the
+# raw C-ordered daily, monthly and monthly count matrices, each starting on an
+# aligned offset
+SNAPSHOT_MAGIC = b"OSACCUBE"
+SNAPSHOT_FORMAT_VERSION = 2
+SNAPSHOT_PREAMBLE = struct.Struct("<8sII")
+SNAPSHOT_ALIGNMENT = 64
+
+
+@lru_cache(maxsize=64)
+def bucket_labels(first_day: str, last_day: str, bucket: int) -> tuple:
+    """End date and axis label of each bucket, formatted once per calendar window"""
+    days = pd.date_range(first_day, last_day, freq='D')
+    ends = days[np.minimum(np.arange(bucket - 1, len(days) + bucket - 1, bucket), len(days) - 1)]
+    return ends, tuple(ends.strftime('%b %d\n%Y'))
+
+# fast_plot_monthly's bar for each 3-bit code: 0 none, 1 gray circles,
+# 2 green circles, 3 solid gray, 4 solid green. A bar needs a protest or an
+# anticipation; anticipation makes it solid and suppression makes it green.
+BAR_CATEGORY_LUT = np.array([0, 1, 3, 3, 0, 2, 4, 4], dtype=np.uint8)
+BAR_CATEGORY_LABELS = [
+    'No protest',
+    'None Anticipated,\nNone Suppressed',
+    'None Anticipated,\nAny Suppressed',
+    'Any Anticipated,\nNone Suppressed',
+    'Any Anticipated,\nAny Suppressed',
+]
+
+# Calendar buckets accepted by range queries, besides a plain number of days
+RANGE_BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+RANGE_LABELS = {
+    'day': '%b %d\n%Y',
+    'week': '%b %d\n%Y',
+    'month': '%b\n%Y',
+    'year': '%Y',
+}
+
+
+def bucket_starts(start: np.datetime64, end: np.datetime64, bucket) -> np.ndarray:
+    """First day of every bucket between start and end, both inclusive"""
+    if bucket == 'week':
+        # 1970-01-01 was a Thursday, so Mondays are 4 days after a multiple of 7
+        first_monday = start + (4 - start.astype(np.int64)) % 7
+        if first_monday == start:
+            first_monday += 7
+        following = np.arange(first_monday, end + 1, 7)
+    elif bucket in ('month', 'quarter'):
+        months = np.arange(start.astype('datetime64[M]') + 1, end.astype('datetime64[M]') + 1)
+        if bucket == 'quarter':
+            months = months[months.astype(np.int64) % 3 == 0]
+        following = months.astype('datetime64[D]')
+    elif bucket == 'year':
+        following = np.arange(start.astype('datetime64[Y]') + 1, end.astype('datetime64[Y]') + 1).astype('datetime64[D]')
+    else:
+        step = 1 if bucket == 'day' else int(bucket)
+        following = np.arange(start + step, end + 1, step)
+    return np.concatenate([[start], following]).astype('datetime64[D]')
+
+
+def bucket_count(start: np.datetime64, end: np.datetime64, bucket) -> int:
+    """len(bucket_starts(start, end, bucket)), without building the array"""
+    if bucket == 'week':
+        first_monday = start + (4 - start.astype(np.int64)) % 7
+        if first_monday == start:
+            first_monday += 7
+        following = (end - first_monday).astype(np.int64) // 7 + 1 if first_monday <= end else 0
+    elif bucket in ('month', 'quarter'):
+        first, last = start.astype('datetime64[M]').astype(np.int64), end.astype('datetime64[M]').astype(np.int64)
+        # Quarters start on months divisible by 3, counting from 1970-01
+        following = last // 3 - first // 3 if bucket == 'quarter' else last - first
+    elif bucket == 'year':
+        following = (end.astype('datetime64[Y]') - start.astype('datetime64[Y]')).astype(np.int64)
+    else:
+        step = 1 if bucket == 'day' else int(bucket)
+        following = (end - start).astype(np.int64) // step
+    return 1 + int(following)
+
+
+class IndicatorCube:
+    """Bit-packed country x day and country x month indicator matrices
+
+    monthly_counts holds how many alerts flagged each indicator per country
+    and month; without counts in the source, each flagged month counts once.
+    """
+    def __init__(self, countries, daily: np.ndarray, daily_start, monthly: np.ndarray, monthly_start,
+                 monthly_counts: np.ndarray = None, version: str = None):
+        self.countries = list(countries)
+        self.country_index = {c: i for i, c in enumerate(self.countries)}
+        self.daily = daily
+        self.daily_start = np.datetime64(daily_start, 'D')
+        self.monthly = monthly
+        self.monthly_start = np.datetime64(monthly_start, 'M')
+        if monthly_counts is None:
+            monthly_counts = np.stack([(monthly & INDICATORS[c]) != 0 for c in COLUMNS], axis=-1).astype(COUNT_DTYPE)
+        self.monthly_counts = monthly_counts
+        # Date labels are shared by every country row, format them once
+        self.daily_labels = np.datetime_as_string(
+            self.daily_start + np.arange(self.daily.shape[1]), unit='D')
+        self.monthly_labels = np.datetime_as_string(
+            self.monthly_start + np.arange(self.monthly.shape[1]), unit='M')
+        self.version = version or self._content_version()
+
+    def _content_version(self) -> str:
+        digest = hashlib.sha1()
+        digest.update("\n".join(self.countries).encode('utf-8'))
+        for matrix, start in ((self.daily, self.daily_start), (self.monthly, self.monthly_start),
+                              (self.monthly_counts, self.monthly_start)):
+            digest.update(f"{start}{matrix.shape}".encode('utf-8'))
+            digest.update(np.ascontiguousarray(matrix).data)
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def empty(cls) -> "IndicatorCube":
+        return cls([], np.zeros((0, 0), dtype=np.uint8), '2004-01-01',
+                   np.zeros((0, 0), dtype=np.uint8), '2004-01')
+
+    @staticmethod
+    def pack(df: pd.DataFrame) -> np.ndarray:
+        """Pack the indicator columns of a frame into one bitfield per row"""
+        bits = np.zeros(len(df), dtype=np.uint8)
+        for column, bit in INDICATORS.items():
+            bits |= np.where(df[column].to_numpy() == 1, bit, 0).astype(np.uint8)
+        return bits
+
+    @staticmethod
+    def unpack(bits: np.ndarray) -> dict:
+        """Split a bitfield array back into 0/1 indicator columns"""
+        return {column: ((bits & bit) != 0).astype(np.int64) for column, bit in INDICATORS.items()}
+
+    @staticmethod
+    def _scatter(df: pd.DataFrame, key: str, unit: str, country_index: dict):
+        """Scatter the rows of a long frame into a [country, offset] matrix
+
+        Returns the matrix, its start, and the [country, offset, indicator]
+        counts when the frame has count columns, else None.
+        """
+        required = {'country', key, *INDICATORS}
+        if df is None or df.empty or not required.issubset(df.columns):
+            return np.zeros((len(country_index), 0), dtype=np.uint8), None, None
+
+        fmt = '%Y-%m-%d' if unit == 'D' else '%Y-%m'
+        dates = pd.to_datetime(df[key], format=fmt, errors='coerce')
+        valid = dates.notna().to_numpy()
+        stamps = dates.to_numpy()[valid].astype(f'datetime64[{unit}]')
+        if len(stamps) == 0:
+            return np.zeros((len(country_index), 0), dtype=np.uint8), None, None
+
+        start = stamps.min()
+        offsets = (stamps - start).astype(np.int64)
+        rows = df['country'][valid].map(country_index).to_numpy(dtype=np.int64)
+
+        matrix = np.zeros((len(country_index), offsets.max() + 1), dtype=np.uint8)
+        np.bitwise_or.at(matrix, (rows, offsets), IndicatorCube.pack(df[valid]))
+        counts = None
+        if set(COUNT_COLUMNS).issubset(df.columns):
+            counts = np.zeros((*matrix.shape, len(COLUMNS)), dtype=COUNT_DTYPE)
+            counts[rows, offsets] = df.loc[valid, COUNT_COLUMNS].to_numpy()
+        return matrix, start, counts
+
+    @classmethod
+    def from_frames(cls, daily_df: pd.DataFrame, monthly_df: pd.DataFrame) -> "IndicatorCube":
+        """Build the cube from the long OSAC_daily / OSAC_monthly frames"""
+        countries = []
+        for df in (daily_df, monthly_df):
+            if df is not None and 'country' in df.columns:
+                countries.extend(df['country'].dropna().unique())
+        countries = list(dict.fromkeys(countries))
+        country_index = {c: i for i, c in enumerate(countries)}
+
+        daily, daily_start, _ = cls._scatter(daily_df, 'date', 'D', country_index)
+        monthly, monthly_start, monthly_counts = cls._scatter(monthly_df, 'month', 'M', country_index)
+        return cls(
+            countries,
+            daily, daily_start if daily_start is not None else '2004-01-01',
+            monthly, monthly_start if monthly_start is not None else '2004-01',
+            monthly_counts,
+        )
+
+    @classmethod
+    def from_events(cls, path: str) -> "IndicatorCube":
+        """Build the cube from the sparse OSAC_events.npz store written by aggregate.py
+
+        The dense daily matrix is materialized here; months are the OR of
+        their days, the same maxima OSAC_monthly.csv holds, and their counts
+        the sum of their days' counts.
+        """
+        with np.load(path) as events:
+            countries = [str(c) for c in events['countries']]
+            daily_start = events['start'].astype('datetime64[D]')[()]
+            rows = events['country'].astype(np.int64)
+            days = events['day'].astype(np.int64)
+            daily = np.zeros((len(countries), int(events['days'])), dtype=np.uint8)
+            daily[rows, days] = cls.pack(pd.DataFrame({column: events[column] for column in INDICATORS}))
+            counts = np.stack([events[column] for column in COUNT_COLUMNS], axis=1)
+        if daily.shape[1] == 0:
+            return cls(countries, daily, daily_start, np.zeros((len(countries), 0), dtype=np.uint8), daily_start)
+        months = (daily_start + np.arange(daily.shape[1])).astype('datetime64[M]')
+        _, month_starts = np.unique(months, return_index=True)
+        monthly = np.bitwise_or.reduceat(daily, month_starts, axis=1)
+        totals = np.zeros((*monthly.shape, len(COLUMNS)), dtype=np.uint32)
+        np.add.at(totals, (rows, (months[days] - months[0]).astype(np.int64)), counts)
+        monthly_counts = np.minimum(totals, np.iinfo(COUNT_DTYPE).max).astype(COUNT_DTYPE)
+        return cls(countries, daily, daily_start, monthly, months[0], monthly_counts)
+
+    def country_row(self, period: str, country: str):
+        """O(1) slice of one country's bitfield row, or None if unknown"""
+        row = self.country_index.get(country)
+        if row is None:
+            return None
+        return self.daily[row] if period == "daily" else self.monthly[row]
+
+    def country_frame(self, period: str, country: str) -> pd.DataFrame:
+        """Country data in the same long layout as the OSAC csv files"""
+        bits = self.country_row(period, country)
+        if bits is None or len(bits) == 0:
+            return pd.DataFrame()
+        key, labels = ('date', self.daily_labels) if period == "daily" else ('month', self.monthly_labels)
+        frame = {'country': country, key: labels}
+        frame.update(self.unpack(bits))
+        return pd.DataFrame(frame, columns=['country', key, *COLUMNS])
+
+    def daily_window(self, country: str, today, days: int = 31, bucket: int = 2) -> pd.DataFrame:
+        """Last `days` days up to today, OR-ed into buckets of `bucket` days
+
+        Same window and pairing as DataParser.daily_df_parsed, but as a row
+        slice and a reshape, so the cost does not depend on the history length.
+        """
+        bits = self.country_row("daily", country)
+        if bits is None or len(bits) == 0:
+            return pd.DataFrame()
+        end = int((np.datetime64(today, 'D') - self.daily_start).astype(np.int64))
+        first = max(end - days + 1, 0)
+        last = min(end, len(bits) - 1)
+        if first > last:
+            return pd.DataFrame()
+
+        window = np.asarray(bits[first:last + 1])
+        padded = np.zeros(-(-len(window) // bucket) * bucket, dtype=np.uint8)
+        padded[:len(window)] = window
+        grouped = np.bitwise_or.reduce(padded.reshape(-1, bucket), axis=1)
+
+        ends, labels = bucket_labels(str(self.daily_start + first), str(self.daily_start + last), bucket)
+        frame = {'country': country, 'date': ends}
+        frame.update(self.unpack(grouped))
+        frame['formatted_date'] = labels
+        return pd.DataFrame(frame, columns=['country', 'date', *COLUMNS, 'formatted_date'])
+
+    def month_window(self, today, months: int) -> slice:
+        """Monthly offsets of the last `months` months up to today's month"""
+        end = int((np.datetime64(today, 'M') - self.monthly_start).astype(np.int64))
+        end = min(end, self.monthly.shape[1] - 1)
+        return slice(max(end - months + 1, 0), end + 1)
+
+    def bar_categories(self, today, months: int) -> np.ndarray:
+        """[country, month] chart category of every country over the window"""
+        return BAR_CATEGORY_LUT[self.monthly[:, self.month_window(today, months)]]
+
+    def alert_counts(self, today, months: int, column: str = 'protest') -> np.ndarray:
+        """[country, month] number of alerts flagging `column` over the window"""
+        return self.monthly_counts[:, self.month_window(today, months), COLUMNS.index(column)]
+
+    def region_rollups(self, regions: dict) -> tuple:
+        """Per month, how many countries of each region had each indicator
+
+        Returns the region names, "World" first, and a [region, indicator,
+        month] count array built with one membership matrix product.
+        """
+        names = ["World"] + sorted(set(regions.values()))
+        membership = np.zeros((len(names), len(self.countries)), dtype=np.uint16)
+        membership[0] = 1
+        for country, row in self.country_index.items():
+            if country in regions:
+                membership[names.index(regions[country]), row] = 1
+        counts = np.stack([
+            membership @ ((self.monthly & bit) != 0).astype(np.uint16)
+            for bit in INDICATORS.values()
+        ], axis=1)
+        return names, counts
+
+    @cached_property
+    def daily_prefix_sums(self) -> np.ndarray:
+        """[indicator, country, day + 1] running count of days with each indicator
+
+        Built once per loaded data version; uint16 holds 179 years of days.
+        """
+        sums = np.zeros((len(INDICATORS), *self.daily.shape[:1], self.daily.shape[1] + 1), dtype=np.uint16)
+        for i, bit in enumerate(INDICATORS.values()):
+            np.cumsum((self.daily & bit) != 0, axis=1, dtype=np.uint16, out=sums[i, :, 1:])
+        return sums
+
+    def range_window(self, country: str, start, end, bucket='month') -> pd.DataFrame:
+        """Indicators of an arbitrary [start, end] window in calendar buckets
+
+        Every bucket is the difference of two prefix sums, so the cost is the
+        number of buckets, not the number of days in the window.
+        """
+        row = self.country_index.get(country)
+        if row is None or self.daily.shape[1] == 0:
+            return pd.DataFrame()
+        last_day = self.daily_start + self.daily.shape[1] - 1
+        start = max(np.datetime64(start, 'D'), self.daily_start)
+        end = min(np.datetime64(end, 'D'), last_day)
+        if start > end:
+            return pd.DataFrame()
+
+        starts = bucket_starts(start, end, bucket)
+        edges = (np.append(starts, end + 1) - self.daily_start).astype(np.int64)
+        sums = self.daily_prefix_sums[:, row, :]
+        counts = sums[:, edges[1:]].astype(np.int64) - sums[:, edges[:-1]]
+
+        dates = pd.DatetimeIndex(starts)
+        if bucket == 'quarter':
+            labels = [f"Q{(d.month - 1) // 3 + 1}\n{d.year}" for d in dates]
+        else:
+            labels = dates.strftime(RANGE_LABELS.get(bucket, RANGE_LABELS['day']))
+        frame = {'country': country, 'date': dates}
+        for i, column in enumerate(INDICATORS):
+            frame[column] = (counts[i] > 0).astype(np.int64)
+            frame[f'{column}_days'] = counts[i]
+        frame['formatted_date'] = labels
+        return pd.DataFrame(frame, columns=[
+            'country', 'date', *COLUMNS, *(f'{c}_days' for c in COLUMNS), 'formatted_date'])
+
+    def preventiveness(self, period: str) -> np.ndarray:
+        """Index of preventiveness of every country at once, as [country, offset]"""
+        matrix = self.daily if period == "daily" else self.monthly
+        # Anticipation and suppression only count alongside a protest
+        return PREVENTIVENESS_LUT[np.where(matrix & PROTEST, matrix, 0)]
+
+    @property
+    def nbytes(self) -> int:
+        return self.daily.nbytes + self.monthly.nbytes + self.monthly_counts.nbytes
+
+    def save(self, path: str) -> None:
+        """Write a versioned binary snapshot, replacing any old one atomically"""
+        header = json.dumps({
+            'version': self.version,
+            'countries': self.countries,
+            'daily_start': str(self.daily_start),
+            'daily_shape': list(self.daily.shape),
+            'monthly_start': str(self.monthly_start),
+            'monthly_shape': list(self.monthly.shape),
+            'monthly_counts_shape': list(self.monthly_counts.shape),
+        }).encode('utf-8')
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(header)))
+            f.write(header)
+            for matrix, dtype in ((self.daily, np.uint8), (self.monthly, np.uint8), (self.monthly_counts, COUNT_DTYPE)):
+                f.write(b"\0" * (-f.tell() % SNAPSHOT_ALIGNMENT))
+                f.write(np.ascontiguousarray(matrix, dtype=dtype).data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IndicatorCube":
+        """Map a snapshot read-only so every worker shares one page-cache copy"""
+        with open(path, 'rb') as f:
+            magic, format_version, header_size = SNAPSHOT_PREAMBLE.unpack(f.read(SNAPSHOT_PREAMBLE.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not an indicator cube snapshot: {path}")
+            if format_version != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"Unsupported snapshot format {format_version}: {path}")
+            header = json.loads(f.read(header_size).decode('utf-8'))
+
+        offset = SNAPSHOT_PREAMBLE.size + header_size
+        matrices = []
+        layout = (
+            (tuple(header['daily_shape']), np.uint8),
+            (tuple(header['monthly_shape']), np.uint8),
+            (tuple(header['monthly_counts_shape']), COUNT_DTYPE),
+        )
+        for shape, dtype in layout:
+            offset += -offset % SNAPSHOT_ALIGNMENT
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            if size:
+                matrices.append(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape))
+            else:
+                matrices.append(np.zeros(shape, dtype=dtype))
+            offset += size
+        return cls(
+            header['countries'],
+            matrices[0], header['daily_start'],
+            matrices[1], header['monthly_start'],
+            matrices[2],
+            version=header['version'],
+        )
+
+
+if __name__ == "__main__":
+    # Rebuild the snapshot from the committed event store, or the csv files, e.g. after a git pull
+    if os.path.exists("OSAC_events.npz"):
+        cube = IndicatorCube.from_events("OSAC_events.npz")
+    else:
+        cube = IndicatorCube.from_frames(pd.read_csv("OSAC_daily.csv"), pd.read_csv("OSAC_monthly.csv"))
+    cube.save("OSAC_cube.bin")
+    print(f"Wrote OSAC_cube.bin ({cube.nbytes} bytes, version {cube.version})")
@@ -0,0 +1,126 @@
+"""Export every country/period page and its charts as static files for nginx
+
+    python parse.py && python export.py
+
+Pages are rendered through Flask's test client, so they are exactly what the
+app would serve. Charts are rendered in the app's process pool, unless their
+input rows are unchanged since the last export, in which case the previous
+file is linked into the new version directory. myapp.conf serves these
+files directly and falls back to Flask on a miss.
+"""
+import hashlib
+import json
+import os
+import shutil
+from urllib.parse import quote_plus
+
+import app
+
+EXPORT_DIR = "export"
+MANIFEST_NAME = "manifest.json"
+PERIODS = ["monthly", "daily"]
+# Chart versions kept on disk, so pages cached in browsers keep their images
+KEEP_VERSIONS = 2
+
+
+def page_path(period: str, country: str) -> str:
+    # nginx matches $arg_country as the browser sent it; URLSearchParams
+    # encodes spaces as '+', like quote_plus
+    return os.path.join("pages", period, quote_plus(country) + ".html")
+
+
+def chart_path(version: str, kind: str, period: str, country: str) -> str:
+    # nginx looks charts up by the decoded $uri, so names are stored as is
+    name = os.path.join(country, "preventiveness.png") if kind == "preventiveness" else country + ".png"
+    return os.path.join("charts", version, "plot", period, name)
+
+
+def frame_digest(df) -> str:
+    return hashlib.sha1(df.to_csv(index=False).encode('utf-8')).hexdigest()
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return True
+
+
+def reuse(old: str, new: str) -> None:
+    os.makedirs(os.path.dirname(new), exist_ok=True)
+    if os.path.exists(new):
+        return
+    try:
+        os.link(old, new)
+    except OSError:
+        shutil.copyfile(old, new)
+
+
+def export(root: str = EXPORT_DIR) -> dict:
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    client = app.app.test_client()
+    pool = app.get_render_pool()
+    with app.app.test_request_context():
+        version = app.chart_version()
+
+    charts, futures = {}, {}
+    stats = {"version": version, "rendered": 0, "reused": 0, "pages_written": 0, "pages_unchanged": 0}
+    for period in PERIODS:
+        options = {"bucket": app.DEFAULT_DAILY_BUCKET} if period == "daily" else {}
+        for country in app.helper.get_country_names():
+            parsed_df = app.get_parsed_data(period, country, **options)
+            if parsed_df.empty:
+                continue
+            kinds = {"chart": app.plot_chart_png}
+            if period == "monthly":
+                kinds["preventiveness"] = app.plot_preventiveness_png
+            digest = frame_digest(parsed_df)
+            for kind, plot in kinds.items():
+                key = f"{kind}/{period}/{country}"
+                path = chart_path(version, kind, period, country)
+                charts[key] = {"input": digest, "path": path}
+                previous = manifest.get("charts", {}).get(key)
+                if previous and previous["input"] == digest and os.path.exists(os.path.join(root, previous["path"])):
+                    reuse(os.path.join(root, previous["path"]), os.path.join(root, path))
+                    stats["reused"] += 1
+                else:
+                    futures[key] = pool.submit(plot, parsed_df)
+
+    for key, future in futures.items():
+        write_if_changed(os.path.join(root, charts[key]["path"]), future.result())
+        stats["rendered"] += 1
+
+    # Pages only link to the charts, they go out once every chart is in place
+    for period in PERIODS:
+        for country in app.helper.get_country_names():
+            response = client.get("/", query_string={"country": country, "period": period})
+            if response.status_code != 200:
+                continue
+            if write_if_changed(os.path.join(root, page_path(period, country)), response.data):
+                stats["pages_written"] += 1
+            else:
+                stats["pages_unchanged"] += 1
+
+    write_if_changed(manifest_path, json.dumps({"version": version, "charts": charts}, indent=1).encode('utf-8'))
+    versions_dir = os.path.join(root, "charts")
+    if not os.path.isdir(versions_dir):
+        return stats
+    versions = sorted(os.listdir(versions_dir), key=lambda v: os.path.getmtime(os.path.join(versions_dir, v)))
+    for old in [v for v in versions if v != version][:-(KEEP_VERSIONS - 1) or None]:
+        shutil.rmtree(os.path.join(versions_dir, old))
+    return stats
+
+
+if __name__ == "__main__":
+    print(json.dumps(export(), indent=2))
@@ -0,0 +1,8 @@
+"""gunicorn settings shared by myapp.service and bench.py"""
+
+
+def post_worker_init(worker):
+    # The worker has imported app.py but not started its request threads yet,
+    # the only point where forking the render processes is safe
+    import app
+    app.init_worker()
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative Prometheus-style latency histogram"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+
+class Metrics:
+    """Per-process stage timings, exported as Server-Timing and Prometheus text
+
+    Stages are timed with `with metrics.stage(name)`. Durations are added to
+    the timings of the current request (one per thread) and to that stage's
+    histogram. Each gunicorn worker keeps its own numbers, so /metrics
+    reports the worker that answered the scrape, labelled by pid.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._histograms = {}
+        self._gauges = {}
+        if hasattr(os, "register_at_fork"):
+            # Render pools are forked while request threads may hold the lock;
+            # a child inheriting it held would block in its first stage
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def begin(self) -> None:
+        self._local.timings = {}
+
+    def timings(self) -> dict:
+        return getattr(self._local, "timings", {})
+
+    def observe(self, family: str, label: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get((family, label))
+            if histogram is None:
+                histogram = self._histograms[(family, label)] = Histogram()
+            histogram.observe(seconds)
+
+    def record(self, name: str, seconds: float) -> None:
+        timings = self.timings()
+        timings[name] = timings.get(name, 0.0) + seconds
+        self.observe("stage", name, seconds)
+
+    def record_all(self, timings: dict) -> None:
+        for name, seconds in timings.items():
+            self.record(name, seconds)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self._gauges[name] = value
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.timings().items())
+
+    def render(self, extra_gauges: dict = None) -> str:
+        """All histograms and gauges in the Prometheus text exposition format"""
+        pid = os.getpid()
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        families = {
+            "stage": ("shiny_stage_seconds", "stage", "Time spent per request stage"),
+            "request": ("shiny_request_seconds", "endpoint", "Request latency per endpoint"),
+        }
+        for family, (metric, label, help_text) in families.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+            for (kind, value), histogram in histograms:
+                if kind != family:
+                    continue
+                labels = f'{label}="{value}",pid="{pid}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{labels}}} {histogram.sum:.6f}")
+                lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+        gauges = {**self._gauges, "shiny_process_resident_memory_bytes": resident_memory_bytes()}
+        gauges.update(extra_gauges or {})
+        for name, value in sorted(gauges.items()):
+            kind = "counter" if name.endswith("_total") else "gauge"
+            lines += [f"# TYPE {name} {kind}", f'{name}{{pid="{pid}"}} {value}']
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> int:
+    """Current RSS from /proc, or the peak RSS where /proc is missing"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+metrics = Metrics()
+
+
+def timed_call(func, *args):
+    """Run func in a render process and return its result with the stage timings taken there"""
+    metrics.begin()
+    result = func(*args)
+    return result, metrics.timings()
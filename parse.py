@@ -7,6 +7,7 @@ from protest import OSACProtestProcessor
 from suppression import OSACSuppressionProcessor
 from anticipation import OSACDateAnticipationProcessor
 from aggregate import OSACAggregateProcessor
+from cube import IndicatorCube
 from scraper import DriveManager,EXTRACTED_DETAILS_CSV_FILE_NAME
 
 
@@ -27,12 +28,17 @@ class DataParser(DriveManager):
         #df = df[['OSAC_Title', "country"]]
         if filename == None:
             filename = self.csv_output_path
-        df.to_csv(filename,index=False, encoding='utf-8')
+        # Written aside and swapped in, so the app never reads a half-written file
+        df.to_csv(filename + ".tmp",index=False, encoding='utf-8')
+        os.replace(filename + ".tmp", filename)
     def upload_to_drive(self, df : pd.DataFrame, filename =None):
         if filename == None:
             filename = EXTRACTED_DETAILS_CSV_FILE_NAME
         csv_data = df.to_dict(orient="records")
         self.write_csv_to_drive(file_name=filename, data_list=csv_data, append=False)
+    def upload_file_to_drive(self, path : str) -> None:
+        with open(path, "rb") as f:
+            self.write_or_replace_bytes_to_drive(os.path.basename(path), f.read())
 
 if __name__ == "__main__":
     data_parser = DataParser("osac.csv","OSAC_parsed.csv")
@@ -42,15 +48,36 @@ if __name__ == "__main__":
     df_with_protest = OSACProtestProcessor(df_with_country).extract
     df_with_suppression = OSACSuppressionProcessor(df_with_protest).extract
     df_with_aniticipation = OSACDateAnticipationProcessor(df_with_suppression).extract
+    # The previous parsed rows and daily output, so that only countries whose
+    # alerts changed are aggregated again
+    aggregate_parser = None
+    if os.path.exists("OSAC_parsed.csv") and os.path.exists("OSAC_events.npz"):
+        try:
+            aggregate_parser = OSACAggregateProcessor("OSAC_parsed.csv", "ISO_country_names.txt")
+            aggregate_parser.load_events("OSAC_events.npz")
+        except Exception as e:
+            print(f"Error loading previous aggregates, aggregating everything: {e}")
+            aggregate_parser = None
     data_parser.save_df(df_with_aniticipation)
     data_parser.upload_to_drive(df_with_aniticipation, filename="OSAC_parsed.csv")
-    aggregate_parser = OSACAggregateProcessor("OSAC_parsed.csv", "ISO_country_names.txt") #input the parseed csv file
-    df_with_daily_data = aggregate_parser.extract_daily_data
+    if aggregate_parser is None:
+        aggregate_parser = OSACAggregateProcessor("OSAC_parsed.csv", "ISO_country_names.txt") #input the parseed csv file
+    else:
+        try:
+            delta, removed = aggregate_parser.changed_rows(pd.read_csv("OSAC_parsed.csv", encoding='utf-8'))
+            aggregate_parser.apply_delta(delta, removed)
+        except ValueError as e:
+            print(f"Error applying changes, aggregating everything: {e}")
+            aggregate_parser = OSACAggregateProcessor("OSAC_parsed.csv", "ISO_country_names.txt")
+    # Daily data is kept sparse, the dense view is materialized by its readers
+    aggregate_parser.save_events("OSAC_events.npz")
+    data_parser.upload_file_to_drive("OSAC_events.npz")
     df_with_monthly_data = aggregate_parser.extract_monthly_data
-    data_parser.save_df(df_with_daily_data, "OSAC_daily.csv")
-    data_parser.upload_to_drive(df_with_daily_data, filename="OSAC_daily.csv")
     data_parser.save_df(df_with_monthly_data,"OSAC_monthly.csv")
     data_parser.upload_to_drive(df_with_monthly_data, filename="OSAC_monthly.csv")
+    aggregate_parser.save_rollups("OSAC_rollups.npz")
+    data_parser.upload_file_to_drive("OSAC_rollups.npz")
+    IndicatorCube.from_events("OSAC_events.npz").save("OSAC_cube.bin")
     
 
     
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # No cross-process locking off POSIX, single-flight stays per process
+    fcntl = None
+
+
+# How often a process waiting on another process's render checks its lock
+SHARED_POLL_INTERVAL = 0.05
+# Shared renders of other generations are only pruned once they are this many
+# seconds old, for processes that have not rolled over to the new one yet
+SHARED_PRUNE_AGE = 300
+
+
+class RenderTimeout(TimeoutError):
+    """Another process held a render's lock for longer than wait_timeout"""
+
+
+class _Flight:
+    """One in-progress render that concurrent callers wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class RenderCache:
+    """Bounded, size-aware LRU cache of rendered chart bytes
+
+    Concurrent misses on one key share a single render: within the process
+    through an in-flight registry, and across processes through a file lock
+    and the rendered bytes left in shared_dir when one is given. Files in
+    shared_dir are held to max_bytes as well, oldest first, and a process
+    waits at most wait_timeout seconds for another one's render.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, shared_dir: Optional[str] = None,
+                 wait_timeout: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.shared_dir = shared_dir if fcntl is not None else None
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._entries = OrderedDict()
+        self._size = 0
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def etag(data: bytes) -> str:
+        return hashlib.sha1(data).hexdigest()
+
+    def _roll(self, generation: Hashable) -> None:
+        """Drop every entry once the data version or the day changes"""
+        if generation != self._generation:
+            self._entries.clear()
+            self._size = 0
+            self._generation = generation
+            self._prune_shared(generation)
+
+    def get(self, key: Hashable, generation: Hashable):
+        with self._lock:
+            self._roll(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, generation: Hashable, data: bytes) -> Tuple[bytes, str]:
+        entry = (data, self.etag(data))
+        if len(data) > self.max_bytes:
+            return entry
+        with self._lock:
+            self._roll(generation)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = entry
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return entry
+
+    def get_or_render(self, key: Hashable, generation: Hashable, render: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """Return (bytes, etag) for key, rendering and storing it on a miss"""
+        entry = self.get(key, generation)
+        if entry is not None:
+            return entry
+        with self._lock:
+            flight = self._flights.get((generation, key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(generation, key)] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.entry
+        try:
+            flight.entry = self.put(key, generation, self._render_shared(key, generation, render))
+            return flight.entry
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[(generation, key)]
+            flight.done.set()
+
+    @staticmethod
+    def _shared_prefix(generation: Hashable) -> str:
+        return hashlib.sha1(repr(generation).encode('utf-8')).hexdigest()[:16]
+
+    def _render_shared(self, key: Hashable, generation: Hashable, render: Callable[[], bytes]) -> bytes:
+        """Render once across processes: the first to take the key's lock renders, the rest read its file"""
+        if self.shared_dir is None:
+            return render()
+        os.makedirs(self.shared_dir, exist_ok=True)
+        name = self._shared_prefix(generation) + "-" + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        path = os.path.join(self.shared_dir, name)
+        data = self._read_shared(path)
+        if data is not None:
+            return data
+        with open(path + ".lock", "a") as lock:
+            self._lock_shared(lock)
+            try:
+                data = self._read_shared(path)
+                if data is not None:
+                    return data
+                data = render()
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            finally:
+                # Processes already waiting hold the old lock file open; later
+                # ones find the rendered file before they need a lock
+                try:
+                    os.remove(path + ".lock")
+                except FileNotFoundError:
+                    pass
+        self._trim_shared()
+        return data
+
+    def _read_shared(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.coalesced += 1
+        return data
+
+    def _lock_shared(self, lock) -> None:
+        """Take an exclusive lock, or raise RenderTimeout after wait_timeout seconds"""
+        deadline = None if self.wait_timeout is None else time.monotonic() + self.wait_timeout
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise RenderTimeout("Timed out waiting for another process's render")
+                time.sleep(SHARED_POLL_INTERVAL)
+
+    def _trim_shared(self) -> None:
+        """Remove the oldest shared renders until they fit in max_bytes"""
+        files = []
+        for entry in os.scandir(self.shared_dir):
+            if entry.name.endswith((".lock", ".tmp")):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _prune_shared(self, generation: Hashable) -> None:
+        """Remove shared renders of other generations older than SHARED_PRUNE_AGE
+
+        Other processes may still be on the previous generation, or already
+        on the next one, so recent files of any generation are left alone.
+        """
+        if self.shared_dir is None or not os.path.isdir(self.shared_dir):
+            return
+        prefix = self._shared_prefix(generation)
+        cutoff = time.time() - SHARED_PRUNE_AGE
+        for entry in os.scandir(self.shared_dir):
+            if entry.name.startswith(prefix):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
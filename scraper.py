@@ -104,6 +104,28 @@ class DriveManager:
             logger.info(f"Existing file '{file_name}' deleted successfully.")
 
         return self.write_text_to_drive(file_name, content, folder_id)
+    def write_or_replace_bytes_to_drive(self, file_name, data, mimetype='application/octet-stream', folder_id=None):
+        """
+        Writes a binary file to Google Drive, replacing it if it already exists.
+        """
+        if folder_id is None:
+            folder_id = self.CSV_FOLDER_ID
+
+        existing_file_id = self.find_file_in_drive(file_name, folder_id)
+        if existing_file_id:
+            self.drive_service.files().delete(fileId=existing_file_id).execute()
+            logger.info(f"Existing file '{file_name}' deleted successfully.")
+
+        file_metadata = {
+            'name': file_name,
+            'mimeType': mimetype,
+            'parents': [folder_id]
+        }
+        media = MediaIoBaseUpload(io.BytesIO(data), mimetype=mimetype)
+        file = self.drive_service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+        logger.info(f"file '{file_name}' created successfully! File ID: {file.get('id')}")
+        self.uploaded_to_drive_log(file_name)
+        return file.get('id')
     def get_text_from_drive(self, file_name, folder_id=None):
             """
             Retrieves the content of a text file from Google Drive by name.
@@ -0,0 +1,100 @@
+from html import escape
+import numpy as np
+import pandas as pd
+from cube import IndicatorCube, PROTEST, ANTICIPATED, SUPPRESSION
+
+# Pixels per data unit; the matplotlib charts use the same data coordinates
+UNIT = 40
+PAD = 4
+FONT = "DejaVu Sans, Bitstream Vera Sans, Arial, sans-serif"
+
+
+def _number(values: np.ndarray) -> list:
+    return [f"{v:.2f}".rstrip('0').rstrip('.') for v in values]
+
+
+def render_monthly_svg(df: pd.DataFrame, n_circles: int = 11) -> str:
+    """SVG twin of DataParser.fast_plot_monthly built from NumPy coordinate arrays"""
+    circle_radius = 0.11
+    circle_gap = 0.3
+    bar_width = 0.3
+    step = 2 * circle_radius + circle_gap
+    bar_height = n_circles * step
+
+    n = len(df)
+    bits = IndicatorCube.pack(df)
+    # Same rules as fast_plot_monthly: a bar needs a protest or an anticipation,
+    # anticipation makes it solid and suppression makes it green
+    drawn = (bits & (PROTEST | ANTICIPATED)) != 0
+    solid = drawn & ((bits & ANTICIPATED) != 0)
+    circles = drawn & ~solid
+    colors = np.where((bits & SUPPRESSION) != 0, 'green', 'gray')
+
+    plot_w = n * UNIT
+    plot_h = (bar_height + 1) * UNIT
+    to_x = lambda x: PAD + (np.asarray(x) + 0.5) * UNIT
+    to_y = lambda y: PAD + plot_h - np.asarray(y) * UNIT
+
+    parts = []
+    bars = np.flatnonzero(solid)
+    xs = _number(to_x(bars - bar_width / 2))
+    parts += [
+        f'<rect x="{x}" y="{to_y(bar_height):.2f}" width="{bar_width * UNIT:.2f}" '
+        f'height="{bar_height * UNIT:.2f}" fill="{c}"/>'
+        for x, c in zip(xs, colors[bars])
+    ]
+
+    dots = np.flatnonzero(circles)
+    cx = _number(to_x(np.repeat(dots, n_circles)))
+    cy = _number(to_y(np.tile(np.arange(n_circles) * step + circle_radius, len(dots))))
+    fills = np.repeat(colors[dots], n_circles)
+    radius = f"{circle_radius * UNIT:.2f}"
+    parts += [
+        f'<circle cx="{x}" cy="{y}" r="{radius}" fill="{c}"/>'
+        for x, y, c in zip(cx, cy, fills)
+    ]
+
+    # Frame, tick marks and two-line date labels
+    base = PAD + plot_h
+    ticks = _number(to_x(np.arange(n)))
+    parts.append(
+        f'<rect x="{PAD}" y="{PAD}" width="{plot_w}" height="{plot_h:.2f}" '
+        f'fill="none" stroke="black" stroke-width="1"/>'
+    )
+    parts += [f'<line x1="{x}" y1="{base:.2f}" x2="{x}" y2="{base + 5:.2f}" stroke="black"/>' for x in ticks]
+    labels = df['formatted_date'].astype(str).tolist() if 'formatted_date' in df else [''] * n
+    for x, label in zip(ticks, labels):
+        lines = ''.join(
+            f'<tspan x="{x}" dy="{0 if i == 0 else 1.2}em">{escape(line)}</tspan>'
+            for i, line in enumerate(label.split('\n'))
+        )
+        parts.append(f'<text x="{x}" y="{base + 17:.2f}" text-anchor="middle">{lines}</text>')
+
+    width = plot_w + 2 * PAD
+    height = base + 40
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height:.2f}" '
+        f'width="{width}" height="{height:.2f}" font-family="{FONT}" font-size="12">'
+        f'<rect width="100%" height="100%" fill="white"/>{"".join(parts)}</svg>'
+    )
+
+
+def render_preventiveness_svg(matrix: np.ndarray) -> str:
+    """SVG twin of DataParser.fast_plot_preventiveness from its 4 x n value matrix"""
+    rows, cols = matrix.shape
+    cell_w, cell_h = UNIT, 24
+    xs = np.tile(PAD + (np.arange(cols) + 0.5) * cell_w, rows)
+    ys = np.repeat(PAD + (np.arange(rows) + 0.5) * cell_h, cols)
+    parts = [
+        f'<text x="{x:.1f}" y="{y:.1f}" text-anchor="middle" dominant-baseline="central">{v}</text>'
+        for x, y, v in zip(xs, ys, matrix.ravel())
+    ]
+    width = cols * cell_w + 2 * PAD
+    height = rows * cell_h + 2 * PAD
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}" font-family="{FONT}" font-size="13">'
+        f'<rect width="100%" height="100%" fill="white"/>'
+        f'<rect x="{PAD}" y="{PAD}" width="{cols * cell_w}" height="{rows * cell_h}" '
+        f'fill="none" stroke="black" stroke-width="1"/>{"".join(parts)}</svg>'
+    )
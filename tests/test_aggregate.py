@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate import OSACAggregateProcessor
+
+COUNTRIES = ["France", "Chile", "Kenya", "Nepal", "Peru", "Japan", "Ghana", "Spain"]
+
+
+def write_alerts(path, n, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2003-10-01") + pd.to_timedelta(rng.integers(0, 7000, n), unit="D")
+    pd.DataFrame({
+        "OSAC_ID": np.arange(n),
+        "country": rng.choice(COUNTRIES + ["Atlantis"], n),
+        "date": dates.strftime("%Y-%m-%d"),
+        "protest": rng.integers(0, 2, n),
+        "suppression": rng.integers(0, 2, n),
+        "anticipated": rng.integers(0, 2, n),
+    }).to_csv(path, index=False)
+
+
+def edit_alerts(path, seed):
+    """Flip, drop and add some rows, including alerts past the current last day"""
+    rng = np.random.default_rng(seed)
+    df = pd.read_csv(path)
+    flipped = rng.choice(len(df), 25, replace=False)
+    df.loc[flipped, "protest"] = 1 - df.loc[flipped, "protest"]
+    df = df.drop(index=rng.choice(len(df), 10, replace=False))
+    new = df.sample(15, random_state=seed).copy()
+    new["OSAC_ID"] += 10 ** 6
+    new["date"] = (pd.Timestamp.now().normalize() + pd.Timedelta(days=3)).strftime("%Y-%m-%d")
+    pd.concat([df, new]).to_csv(path, index=False)
+
+
+@pytest.fixture
+def files(tmp_path):
+    iso = tmp_path / "ISO_country_names.txt"
+    iso.write_text("\n".join(COUNTRIES) + "\n", encoding="utf-8")
+    parsed = tmp_path / "OSAC_parsed.csv"
+    write_alerts(parsed, 600, seed=1)
+    return str(parsed), str(iso), str(tmp_path / "OSAC_events.npz")
+
+
+def rebuild_incrementally(parsed, iso, events, edit):
+    """(processor updated from the event store with the rows edit changed, full rebuild)"""
+    OSACAggregateProcessor(parsed, iso).save_events(events)
+    previous = OSACAggregateProcessor(parsed, iso)
+    previous.load_events(events)
+    edit(parsed)
+    delta, removed = previous.changed_rows(pd.read_csv(parsed, encoding="utf-8"))
+    previous.apply_delta(delta, removed)
+    return previous, OSACAggregateProcessor(parsed, iso)
+
+
+def assert_same_outputs(previous, full):
+    assert previous.extract_daily_data.to_csv(index=False) == full.extract_daily_data.to_csv(index=False)
+    assert previous.extract_monthly_data.to_csv(index=False) == full.extract_monthly_data.to_csv(index=False)
+    for name in ["week", "quarter", "year", "rolling_90"]:
+        assert previous.extract_rollup_data(name).equals(full.extract_rollup_data(name))
+
+
+def test_incremental_matches_full_rebuild(files):
+    previous, full = rebuild_incrementally(*files, lambda parsed: edit_alerts(parsed, seed=2))
+    assert_same_outputs(previous, full)
+
+
+def test_incremental_matches_full_rebuild_without_latest_alerts(files):
+    def drop_latest(parsed):
+        df = pd.read_csv(parsed)
+        df[pd.to_datetime(df["date"]) < pd.to_datetime(df["date"]).max()].to_csv(parsed, index=False)
+
+    previous, full = rebuild_incrementally(*files, drop_latest)
+    assert_same_outputs(previous, full)
+
+
+def blank_ids(path, rows):
+    df = pd.read_csv(path)
+    df["OSAC_ID"] = df["OSAC_ID"].astype(object)
+    df.loc[rows, "OSAC_ID"] = ""
+    df.to_csv(path, index=False)
+
+
+def test_alerts_without_ids_are_matched_as_a_group(files):
+    parsed, iso, events = files
+    blank_ids(parsed, range(5))
+
+    def edit(parsed):
+        df = pd.read_csv(parsed)
+        df.loc[df["OSAC_ID"].isna() & (df.index > 0), "protest"] = 1
+        df.loc[len(df)] = [np.nan, "Peru", "2010-05-05", 1, 0, 1]
+        df.to_csv(parsed, index=False)
+
+    previous, full = rebuild_incrementally(parsed, iso, events, edit)
+    assert_same_outputs(previous, full)
+
+
+def test_event_store_round_trip(files):
+    parsed, iso, events = files
+    full = OSACAggregateProcessor(parsed, iso)
+    full.save_events(events)
+    loaded = OSACAggregateProcessor(parsed, iso)
+    loaded.load_events(events)
+    assert loaded.extract_daily_data.equals(full.extract_daily_data)
+    assert loaded.extract_monthly_data.equals(full.extract_monthly_data)
+
+
+def test_event_store_of_another_parsed_file_is_rejected(files):
+    parsed, iso, events = files
+    OSACAggregateProcessor(parsed, iso).save_events(events)
+    # As when parse.py replaced the parsed file but stopped before the event store
+    edit_alerts(parsed, seed=3)
+    with pytest.raises(ValueError):
+        OSACAggregateProcessor(parsed, iso).load_events(events)
+
+
+def test_duplicate_ids_are_not_matched(files):
+    parsed, iso, _ = files
+    previous = OSACAggregateProcessor(parsed, iso)
+    blank_ids(parsed, range(5))
+    # Alerts without an ID are matched as a group, but a repeated ID is ambiguous
+    previous.changed_rows(pd.read_csv(parsed))
+    df = pd.read_csv(parsed)
+    df.loc[10, "OSAC_ID"] = df.loc[11, "OSAC_ID"]
+    with pytest.raises(ValueError):
+        previous.changed_rows(df)
@@ -0,0 +1,42 @@
+"""Renders run on request threads and in the render pool, so they must not share pyplot state"""
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import app
+
+COUNTRIES = 24
+THREADS = 8
+
+
+def country_frames():
+    """Parsed monthly frames of made-up countries over the last year"""
+    rng = np.random.default_rng(0)
+    months = pd.period_range(end=pd.Timestamp.today(), periods=12, freq="M").strftime("%Y-%m")
+    frames = []
+    for i in range(COUNTRIES):
+        frame = pd.DataFrame({"country": f"Country {i}", "month": months})
+        for column in ["protest", "suppression", "anticipated"]:
+            frame[column] = rng.integers(0, 2, len(months))
+        frames.append(app.DataParser.monthly_df_parsed(frame))
+    return frames
+
+
+def render_all(render, frames, threads):
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(render, frames))
+
+
+def test_country_charts_match_serial_renders():
+    frames = country_frames()
+    for render in (app.plot_chart_png, app.plot_preventiveness_png):
+        serial = [render(frame) for frame in frames]
+        assert all(serial)
+        # Twice over, so the same chart is also drawn on several threads at once
+        assert render_all(render, frames * 2, THREADS) == serial * 2
+
+
+def test_example_plot_matches_serial_render():
+    serial = app.render_example_plot()
+    assert render_all(lambda _: app.render_example_plot(), range(COUNTRIES), THREADS) == [serial] * COUNTRIES